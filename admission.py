@@ -0,0 +1,111 @@
+import asyncio
+import contextlib
+import functools
+import math
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed because the work queue is full."""
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"{name} queue is full, retry in {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounded work queue for CPU-heavy request handlers.
+
+    At most `max_concurrency` requests run at once, on a dedicated thread pool
+    so the event loop keeps serving cheap routes. Up to `max_queue` more wait
+    for a slot; anything beyond that is rejected immediately with Overloaded.
+
+    Usage:
+        async with gate.slot():
+            result = await gate.run(blocking_func, arg)
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, sample_size: int = 1024):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=name)
+        self.waiting = 0
+        self.running = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._service_total = 0.0
+        # Recent wait times (seconds) for percentiles
+        self._waits = deque(maxlen=sample_size)
+
+    def retry_after(self) -> int:
+        """Seconds until a queued slot is likely free, from the mean service time."""
+        mean_service = self._service_total / self.completed if self.completed else 1.0
+        backlog = (self.waiting + self.running) / self.max_concurrency
+        return max(1, math.ceil(backlog * mean_service))
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Wait for a run slot, or raise Overloaded at once if the queue is full."""
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(self.name, self.retry_after())
+        self.waiting += 1
+        queued_at = time.monotonic()
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        started_at = time.monotonic()
+        waited = started_at - queued_at
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        self._waits.append(waited)
+        self.admitted += 1
+        self.running += 1
+        try:
+            yield self
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self._service_total += time.monotonic() - started_at
+            self._slots.release()
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking function on this controller's thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+
+        def pct(p):
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 2)
+
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_depth": self.waiting,
+            "in_flight": self.running,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "wait_ms": {
+                "mean": round(self._wait_total / self.admitted * 1000, 2) if self.admitted else 0.0,
+                "p50": pct(0.50),
+                "p95": pct(0.95),
+                "p99": pct(0.99),
+                "max": round(self._wait_max * 1000, 2),
+            },
+            "service_ms_mean": round(self._service_total / self.completed * 1000, 2) if self.completed else 0.0,
+        }
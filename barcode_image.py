@@ -1,5 +1,6 @@
 import cv2
 import sys
+from gtin import normalize_gtin
 
 def detect_barcode(image, show_result=True):
     """
@@ -10,7 +11,9 @@ def detect_barcode(image, show_result=True):
         show_result: Whether to display the result with annotations (default: True)
     
     Returns:
-        dict: Contains 'success', 'barcode_text', 'corners', and 'image_with_annotations'
+        dict: Contains 'success', 'barcode_text', 'barcode_type', 'gtin', 'corners',
+        and 'image_with_annotations'. 'gtin' is the canonical GTIN-14 of the decoded
+        text, or None if it does not pass check-digit validation.
     """
     # Handle both image path strings and numpy arrays
     if isinstance(image, str):
@@ -20,6 +23,8 @@ def detect_barcode(image, show_result=True):
                 'success': False,
                 'error': f"Cannot load image at {image}",
                 'barcode_text': None,
+                'barcode_type': None,
+                'gtin': None,
                 'corners': None,
                 'image_with_annotations': None
             }
@@ -35,6 +40,8 @@ def detect_barcode(image, show_result=True):
     result = {
         'success': False,
         'barcode_text': None,
+        'barcode_type': None,
+        'gtin': None,
         'corners': None,
         'image_with_annotations': None
     }
@@ -48,6 +55,9 @@ def detect_barcode(image, show_result=True):
         barcode_text = decoded_info[0]
         result['success'] = True
         result['barcode_text'] = barcode_text
+        barcode_type = decoded_type[0] if decoded_type else None
+        result['barcode_type'] = barcode_type
+        result['gtin'] = normalize_gtin(barcode_text, upce=(barcode_type == "UPC_E"))
         result['corners'] = corners[0] if corners is not None else None
         
         if show_result:
@@ -0,0 +1,108 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+
+def content_hash(data: bytes) -> str:
+    """Fast digest of the raw upload bytes (exact-duplicate key)."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def perceptual_hash(image: Image.Image, hash_size: int = 16) -> int:
+    """
+    Difference hash (dHash) of a downscaled grayscale frame, as a hash_size**2-bit int.
+    Near-identical frames (recompression, small sensor noise) land within a few bits.
+    Pass a freshly opened image: JPEGs are decoded at reduced scale via draft().
+    """
+    image.draft("L", (hash_size * 4, hash_size * 4))
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = small.tobytes()  # one byte per "L" pixel, row-major
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return bits
+
+
+class DetectionCache:
+    """
+    Bounded LRU cache of barcode detection results.
+
+    Entries are keyed by the content hash of the uploaded bytes. When
+    `perceptual` is enabled they also carry a dHash of the frame, and a miss on
+    the content hash can still match a previous successful detection whose dHash
+    is within `max_distance` bits.
+
+    get() and get_similar() don't count anything: the caller knows which lookups
+    make up one request and reports the outcome with record().
+    """
+
+    def __init__(self, max_entries: int = 512, perceptual: bool = False, max_distance: int = 6):
+        self.max_entries = max_entries
+        self.perceptual = perceptual
+        self.max_distance = max_distance
+        self._entries = OrderedDict()  # digest -> (result, phash)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.perceptual_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, digest: str):
+        """Return a cached result for identical bytes, or None."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            self._entries.move_to_end(digest)
+            return dict(entry[0])
+
+    def get_similar(self, phash: int):
+        """Return the result of a near-identical frame that had a barcode, or None."""
+        with self._lock:
+            for key in reversed(self._entries):
+                result, other = self._entries[key]
+                if (
+                    other is not None
+                    and result.get("success")
+                    and (phash ^ other).bit_count() <= self.max_distance
+                ):
+                    self._entries.move_to_end(key)
+                    return dict(result)
+            return None
+
+    def record(self, outcome: str):
+        """Count one request's lookup outcome: "hit", "perceptual_hit" or "miss"."""
+        with self._lock:
+            if outcome == "hit":
+                self.hits += 1
+            elif outcome == "perceptual_hit":
+                self.perceptual_hits += 1
+            elif outcome == "miss":
+                self.misses += 1
+            else:
+                raise ValueError(f"Unknown cache outcome {outcome!r}")
+
+    def put(self, digest: str, result: dict, phash: int = None):
+        with self._lock:
+            self._entries[digest] = (dict(result), phash)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.perceptual_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "perceptual": self.perceptual,
+            "hits": self.hits,
+            "perceptual_hits": self.perceptual_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.perceptual_hits) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,278 @@
+"""
+Classify a large product catalog for SNAP eligibility.
+
+Streams a JSONL or CSV catalog in the format_off_product() input shape
+("Barcode", "Name", "Categories", "Ingredients", "Sugar (g)") through
+check_eligibility across a process pool and appends one JSON line per input
+row to the output file, in input order.
+
+Progress is checkpointed after every batch, so re-running the same command
+after a crash resumes where it stopped. Memory stays bounded: only
+`workers * 2` batches are in flight at any time. One output never mixes policy
+versions: resuming after the tables changed, or a hot reload mid-run, stops
+with an error and needs --restart.
+
+With --with-inputs each line also stores the normalized inputs and a per-state
+rule fingerprint, and the policy tables used are saved to
+<output>.policies.json, so eligibility.reevaluate can later update the results
+for a policy change without classifying the whole catalog again.
+
+Usage:
+    python -m eligibility.bulk_classify catalog.jsonl -o results.jsonl
+    python -m eligibility.bulk_classify catalog.csv -o results.jsonl --states ID,US --workers 8
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from eligibility.ebt_eligibility import (
+    check_eligibility_multi, check_eligibility_stored, format_off_product, load_policies,
+)
+
+
+def read_rows(path: str, fmt: str):
+    """
+    Yield raw catalog rows one at a time: JSONL rows as undecoded lines
+    (parsed in the workers), CSV rows as dicts.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield line
+
+
+def _parse_row(raw) -> dict:
+    if isinstance(raw, str):
+        return json.loads(raw)
+    # CSV: categories as a JSON array or comma-separated tags, sugar as a number
+    row = dict(raw)
+    cats = (row.get("Categories") or "").strip()
+    if cats.startswith("["):
+        row["Categories"] = json.loads(cats)
+    else:
+        row["Categories"] = [c.strip() for c in cats.split(",") if c.strip()]
+    sugar = (row.get("Sugar (g)") or "").strip()
+    row["Sugar (g)"] = float(sugar) if sugar else None
+    return row
+
+
+def make_record(row_number: int, barcode: str, name: str, results: dict, inputs=None, fingerprints=None) -> dict:
+    """One output line: a single state's result inline, several under "results"."""
+    record = {"row": row_number, "barcode": barcode, "name": name}
+    if len(results) == 1:
+        record.update(next(iter(results.values())))
+    else:
+        record["results"] = results
+    if inputs is not None:
+        record["inputs"] = inputs
+        record["fingerprint"] = fingerprints
+    return record
+
+
+class PolicyVersionChanged(ValueError):
+    """The policy tables were hot-reloaded during a run."""
+
+
+def _check_versions(results: dict, versions: dict):
+    for state, result in results.items():
+        if result["policy_version"] != versions[state]:
+            raise PolicyVersionChanged(
+                f"Policy for {state} changed from {versions[state]} to {result['policy_version']} "
+                f"during the run; re-run with --restart to classify everything under one version"
+            )
+
+
+def classify_batch(batch: list, states: list, with_inputs: bool = False, versions: dict = None) -> list:
+    """
+    Classify a batch of (row_number, raw_row) pairs. With `versions` (state ->
+    policy version), raises PolicyVersionChanged if any row was evaluated under
+    another version, so one output never mixes policy versions.
+
+    Returns:
+        list of JSON-encoded result lines, one per input row
+    """
+    out = []
+    for row_number, raw in batch:
+        try:
+            row = _parse_row(raw)
+            product = format_off_product(row)
+            product["barcode"] = str(row.get("Barcode") or "")
+            if with_inputs:
+                results, inputs, fingerprints = check_eligibility_stored(product, states)
+            else:
+                results, inputs, fingerprints = check_eligibility_multi(product, states), None, None
+            if versions is not None:
+                _check_versions(results, versions)
+            record = make_record(row_number, product["barcode"], product["name"], results, inputs, fingerprints)
+        except PolicyVersionChanged:
+            raise
+        except Exception as e:
+            record = {"row": row_number, "error": str(e)}
+        out.append(json.dumps(record, ensure_ascii=False))
+    return out
+
+
+def _batches(rows, batch_size: int, start: int):
+    batch = []
+    for row_number, raw in enumerate(rows, start):
+        batch.append((row_number, raw))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def load_checkpoint(path: str):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    """Atomically replace the checkpoint file."""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def save_policy_snapshot(path: str, policies: dict, states: list):
+    """Save the raw policy tables for states, for a later eligibility.reevaluate run."""
+    save_checkpoint(path, {state: policies[state]["raw"] for state in states})
+
+
+def run(input_path, output_path, states, fmt=None, workers=None, batch_size=500,
+        checkpoint_path=None, restart=False, with_inputs=False, log=sys.stderr) -> dict:
+    """
+    Classify input_path into output_path, resuming from checkpoint_path if present.
+
+    Returns:
+        the final checkpoint dict (rows_done, output_bytes, ...)
+    """
+    fmt = fmt or ("csv" if input_path.lower().endswith(".csv") else "jsonl")
+    workers = workers or os.cpu_count() or 1
+    checkpoint_path = checkpoint_path or output_path + ".ckpt"
+    policies = load_policies()
+    for state in states:
+        if state not in policies:
+            raise KeyError(f"No eligibility policy for state {state!r}")
+
+    versions = {s: policies[s]["version"] for s in states}
+    checkpoint = None if restart else load_checkpoint(checkpoint_path)
+    if checkpoint and checkpoint.get("policy_versions") != versions:
+        raise ValueError(
+            f"Checkpoint {checkpoint_path} was written under policy versions {checkpoint.get('policy_versions')}, "
+            f"now {versions}; use --restart"
+        )
+    if checkpoint and (
+        checkpoint.get("input") != os.path.abspath(input_path)
+        or checkpoint.get("states") != states
+        or checkpoint.get("with_inputs", False) != with_inputs
+    ):
+        raise ValueError(
+            f"Checkpoint {checkpoint_path} belongs to a different input or state list; use --restart"
+        )
+    if checkpoint is None:
+        checkpoint = {
+            "input": os.path.abspath(input_path),
+            "states": states,
+            "policy_versions": versions,
+            "with_inputs": with_inputs,
+            "rows_done": 0,
+            "output_bytes": 0,
+        }
+
+    rows_done = checkpoint["rows_done"]
+    if rows_done and not os.path.exists(output_path):
+        raise ValueError(f"Checkpoint {checkpoint_path} found but {output_path} is missing; use --restart")
+    # Drop anything written after the last checkpoint (a partially flushed batch)
+    out = open(output_path, "r+b" if rows_done else "wb")
+    out.truncate(checkpoint["output_bytes"])
+    out.seek(checkpoint["output_bytes"])
+    if rows_done:
+        print(f"Resuming after row {rows_done}", file=log)
+    if with_inputs:
+        save_policy_snapshot(output_path + ".policies.json", policies, states)
+
+    rows = read_rows(input_path, fmt)
+    for _ in range(rows_done):
+        next(rows, None)
+    batches = _batches(rows, batch_size, rows_done)
+
+    started = time.monotonic()
+    processed = 0
+
+    def write_batch(lines):
+        nonlocal processed
+        out.write(("\n".join(lines) + "\n").encode("utf-8"))
+        out.flush()
+        os.fsync(out.fileno())
+        checkpoint["rows_done"] += len(lines)
+        checkpoint["output_bytes"] = out.tell()
+        save_checkpoint(checkpoint_path, checkpoint)
+        processed += len(lines)
+
+    try:
+        if workers == 1:
+            for batch in batches:
+                write_batch(classify_batch(batch, states, with_inputs, versions))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = deque()
+                for batch in batches:
+                    pending.append(pool.submit(classify_batch, batch, states, with_inputs, versions))
+                    # Bound memory: never hold more than 2 batches per worker
+                    if len(pending) >= workers * 2:
+                        write_batch(pending.popleft().result())
+                while pending:
+                    write_batch(pending.popleft().result())
+    finally:
+        out.close()
+
+    elapsed = time.monotonic() - started
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"Classified {processed} rows ({checkpoint['rows_done']} total) in {elapsed:.1f}s, {rate:.0f} rows/s",
+          file=log)
+    return checkpoint
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify a product catalog for SNAP eligibility.")
+    parser.add_argument("input", help="catalog file (.jsonl or .csv)")
+    parser.add_argument("-o", "--output", required=True, help="JSONL results file")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="input format (default: from extension)")
+    parser.add_argument("--states", default="ID", help="comma-separated state codes (default: ID)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=500, help="rows per batch and checkpoint")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <output>.ckpt)")
+    parser.add_argument("--restart", action="store_true", help="ignore any checkpoint and start over")
+    parser.add_argument("--with-inputs", action="store_true",
+                        help="store normalized inputs and rule fingerprints for eligibility.reevaluate")
+    args = parser.parse_args(argv)
+
+    states = [s.strip() for s in args.states.split(",") if s.strip()]
+    try:
+        run(args.input, args.output, states, fmt=args.format, workers=args.workers,
+            batch_size=args.batch_size, checkpoint_path=args.checkpoint, restart=args.restart,
+            with_inputs=args.with_inputs)
+    except (KeyError, ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import shutil
+
+import pytest
+from eligibility import ebt_eligibility
+
+# Catalog rows in bulk_classify's input shape, between them reaching every rule block
+CATALOG = [
+    {"Barcode": "025000040801", "Name": "Simply Orange With Mango",
+     "Categories": ["en:beverages", "en:plant-based-beverages"],
+     "Ingredients": "Contains orange juice, mango puree, natural flavors.", "Sugar (g)": 25},
+    {"Barcode": "0049000000443", "Name": "Coca-Cola Classic", "Categories": ["en:carbonated-soft-drinks"],
+     "Ingredients": "carbonated water, high fructose corn syrup, caramel color", "Sugar (g)": 39},
+    {"Barcode": "0072250037129", "Name": "Whole Wheat Bread", "Categories": ["en:breads"],
+     "Ingredients": "whole wheat flour, yeast, water, salt", "Sugar (g)": 3},
+    {"Barcode": "5449000131805", "Name": "Coca-Cola Zero", "Categories": ["en:beverages", "en:sodas"],
+     "Ingredients": "carbonated water, caramel color, aspartame, acesulfame k", "Sugar (g)": 0},
+    {"Barcode": "0041220576463", "Name": "Rotisserie Chicken", "Categories": ["en:meats"],
+     "Ingredients": "chicken, salt, spices", "Sugar (g)": 0},
+    {"Barcode": "0031604026165", "Name": "Vitamin Supplement Gummies", "Categories": [],
+     "Ingredients": "sugar, gelatin", "Sugar (g)": None},
+    {"Barcode": "0012000161155", "Name": "Agave Lemonade Drink Mix", "Categories": ["en:beverages"],
+     "Ingredients": "water, agave nectar, lemon juice", "Sugar (g)": None},
+    {"Barcode": "0016000275287", "Name": "Honey Oat Cereal", "Categories": ["en:breakfast-cereals", "en:snacks"],
+     "Ingredients": "", "Sugar (g)": 12},
+]
+
+
+@pytest.fixture
+def catalog():
+    return [dict(row) for row in CATALOG]
+
+
+@pytest.fixture
+def policy_dir(tmp_path, monkeypatch):
+    # A writable copy of the policy tables, loaded in place of the shipped ones
+    policies = tmp_path / "policies"
+    policies.mkdir()
+    for path in ebt_eligibility.POLICY_DIR.glob("*.json"):
+        shutil.copy(path, policies / path.name)
+    monkeypatch.setattr(ebt_eligibility, "POLICY_DIR", policies)
+    ebt_eligibility.load_policies(force=True)
+    yield policies
+    monkeypatch.undo()
+    ebt_eligibility.load_policies(force=True)
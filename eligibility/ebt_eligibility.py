@@ -1,7 +1,28 @@
+import json
+import logging
+import os
 import re
+import threading
+import time
 from datetime import date
+from pathlib import Path
 
-POLICY_VERSION = "ID-HB109-v2-2026"
+logger = logging.getLogger(__name__)
+
+# Versioned policy tables, one JSON file per state (e.g. policies/ID.json).
+# Override with EBT_POLICY_DIR to point workers at a shared, hot-reloadable location.
+POLICY_DIR = Path(os.environ.get("EBT_POLICY_DIR") or Path(__file__).resolve().parent / "policies")
+DEFAULT_STATE = "ID"
+POLICY_RELOAD_INTERVAL = 2.0  # seconds between policy file mtime checks
+
+# Version of the default state's policy; kept current across hot reloads.
+POLICY_VERSION = None
+
+# Record per-rule timing and hit counters for every evaluation (see rule_stats()).
+# Individual calls can opt in with trace=True, which also attaches the trace to the result.
+TRACE_ENABLED = os.environ.get("EBT_TRACE", "0") == "1"
+
+_JUICE_PERCENT_RE = re.compile(r'\d{1,3}\s*%')
 
 def estimate_juice_percent(ingredients_text: str) -> float:
     """Heuristically estimate juice content percentage from ingredients."""
@@ -18,37 +39,302 @@ def estimate_juice_percent(ingredients_text: str) -> float:
         return 25.0
     return 0.0
 
-def is_prepared_food(product):
-    categories = [c.lower().strip() for c in product.get("Categories") or product.get("categories", [])]
-    name = (product.get("Name") or product.get("name", "")).lower()
+# --- Policy tables ---
 
-    prepped_keywords = [
-        "hot", "rotisserie", "ready to eat", "freshly prepared",
-        "ready meal", "ready-to-eat"
-    ]
-    prepped_categories = ["en:ready-meals", "en:prepared-meals", "en:cooked-meals"]
+def compile_policy(raw: dict) -> dict:
+    """
+    Compile a raw policy table into the lookup structures used by the evaluator:
+    keyword and category lists become frozensets so rules can test them against
+    a product's precomputed keyword hits with set operations.
+    Optional rule blocks ("banned_categories", "sweetened_beverage_ban") may be null.
+    """
+    try:
+        banned = raw.get("banned_categories")
+        ban = raw.get("sweetened_beverage_ban")
+        return {
+            "state": raw["state"],
+            "version": raw["version"],
+            "program": raw.get("program", raw["state"]),
+            "eligible_reason": raw["eligible_reason"],
+            "missing_categories_tip": raw["missing_categories_tip"],
+            "min_confidence": float(raw["min_confidence"]),
+            "penalties": {k: float(v) for k, v in raw["penalties"].items()},
+            "sensitive_category_keywords": frozenset(raw["sensitive_category_keywords"]),
+            "prepared_food": {
+                "name_keywords": frozenset(raw["prepared_food"]["name_keywords"]),
+                "categories": frozenset(raw["prepared_food"]["categories"]),
+            },
+            "vague_ingredients": {
+                "min_ingredients": int(raw["vague_ingredients"]["min_ingredients"]),
+                "clarifying_keywords": frozenset(raw["vague_ingredients"]["clarifying_keywords"]),
+            },
+            "generic_category": {
+                "max_categories": int(raw["generic_category"]["max_categories"]),
+                "keywords": tuple(raw["generic_category"]["keywords"]),
+            },
+            "banned_categories": banned and {
+                "categories": frozenset(banned["categories"]),
+                "reason": banned["reason"],
+            },
+            "sweetened_beverage_ban": ban and {
+                "beverage_category_keywords": frozenset(ban["beverage_category_keywords"]),
+                "sweetener_keywords": frozenset(ban["sweetener_keywords"]),
+                "artificial_sweetener_keywords": frozenset(ban["artificial_sweetener_keywords"]),
+                "milk_category_keywords": frozenset(ban["milk_category_keywords"]),
+                "mixable_name_keywords": frozenset(ban["mixable_name_keywords"]),
+                "max_juice_percent": float(ban["max_juice_percent"]),
+                "missing_sugar_confidence_cap": float(ban["missing_sugar_confidence_cap"]),
+                "borderline_juice_percent": tuple(float(x) for x in ban["borderline_juice_percent"]),
+                "reason": ban["reason"],
+            },
+            "federal": {
+                "name_keywords": frozenset(raw["federal"]["name_keywords"]),
+                "categories": frozenset(raw["federal"]["categories"]),
+                "reason": raw["federal"]["reason"],
+            },
+            "domestic_barcode_prefixes": tuple(raw["domestic_barcode_prefixes"]),
+            # The table as loaded, for snapshots of the policy a result was computed under
+            "raw": raw,
+        }
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid policy table {raw.get('state', '?')!r}: {e!r}") from e
+
+def _build_feature_index(policies: dict) -> dict:
+    """
+    Union the keywords of every loaded policy so a product's fields are scanned
+    once per request, however many states it is evaluated against.
+    """
+    name_kw, ingredient_kw, category_kw = set(), set(), set()
+    for pol in policies.values():
+        name_kw.update(pol["prepared_food"]["name_keywords"])
+        name_kw.update(pol["federal"]["name_keywords"])
+        ingredient_kw.update(pol["vague_ingredients"]["clarifying_keywords"])
+        category_kw.update(pol["sensitive_category_keywords"])
+        ban = pol["sweetened_beverage_ban"]
+        if ban:
+            name_kw.update(ban["mixable_name_keywords"])
+            ingredient_kw.update(ban["sweetener_keywords"])
+            ingredient_kw.update(ban["artificial_sweetener_keywords"])
+            category_kw.update(ban["beverage_category_keywords"])
+            category_kw.update(ban["milk_category_keywords"])
+    return {
+        "name": tuple(name_kw),
+        "ingredients": tuple(ingredient_kw),
+        "categories": tuple(category_kw),
+    }
 
-    # Check category matches
-    if any(cat in prepped_categories for cat in categories):
-        return True
+def _match_keywords(keywords: tuple, text: str) -> frozenset:
+    """Return the subset of keywords occurring anywhere in text."""
+    if not text:
+        return frozenset()
+    return frozenset([k for k in keywords if k in text])
 
-    # Check if name implies it's hot/prepared
-    if any(k in name for k in prepped_keywords):
-        return True
+_policy_lock = threading.Lock()
+_policy_state = None  # (policies, feature_index, file_mtimes, checked_at)
 
-    return False
+def _policy_files():
+    return {str(p): p.stat().st_mtime_ns for p in sorted(POLICY_DIR.glob("*.json"))}
 
-def check_eligibility(product: dict) -> dict:
+def load_policies(force: bool = False) -> dict:
     """
-    Determine Idaho EBT eligibility based on HB109 + 2026 sweetened beverage ban.
-    Returns dict with eligible, reason, confidence, policy_version, user_tips, and confidence_reason.
+    Return the compiled policy tables keyed by state, reloading them from
+    POLICY_DIR when a file was added, removed or modified. Files are checked at
+    most every POLICY_RELOAD_INTERVAL seconds. If a reload fails, the previously
+    loaded tables stay in effect.
+    """
+    global _policy_state, POLICY_VERSION
+    state = _policy_state
+    now = time.monotonic()
+    if state is not None and not force and now - state[3] < POLICY_RELOAD_INTERVAL:
+        return state[0]
+
+    with _policy_lock:
+        state = _policy_state
+        if state is not None and not force and now - state[3] < POLICY_RELOAD_INTERVAL:
+            return state[0]
+        try:
+            mtimes = _policy_files()
+            if state is not None and not force and mtimes == state[2]:
+                _policy_state = (state[0], state[1], state[2], now)
+                return state[0]
+            policies = {}
+            for path in mtimes:
+                with open(path, encoding="utf-8") as f:
+                    pol = compile_policy(json.load(f))
+                policies[pol["state"]] = pol
+            if DEFAULT_STATE not in policies:
+                raise ValueError(f"No policy table for default state {DEFAULT_STATE!r} in {POLICY_DIR}")
+        except (OSError, ValueError) as e:
+            if state is None:
+                raise
+            logger.error("Policy reload failed, keeping %s: %s", POLICY_VERSION, e)
+            _policy_state = (state[0], state[1], state[2], now)
+            return state[0]
+
+        _policy_state = (policies, _build_feature_index(policies), mtimes, now)
+        POLICY_VERSION = policies[DEFAULT_STATE]["version"]
+        return policies
+
+def get_policy(state: str = DEFAULT_STATE) -> dict:
+    policies = load_policies()
+    if state not in policies:
+        raise KeyError(f"No eligibility policy for state {state!r}")
+    return policies[state]
+
+
+# --- Evaluation ---
+
+class ProductFeatures(dict):
+    """
+    Normalized product fields plus derived features (keyword hits, juice estimate).
+    Features every policy reads are computed up front; the rest on first access.
+    Either way each is computed once and shared by every policy evaluated.
     """
 
-    categories = product.get("categories", [])
-    nutrients = product.get("nutrients", {})
-    ingredients = product.get("ingredients", "").lower()
-    name = product.get("name", "").lower()
-    barcode = str(product.get("barcode", ""))
+    def __init__(self, product: dict, index: dict):
+        categories = product.get("categories", [])
+        name = product.get("name", "").lower()
+        prepared_name = (product.get("Name") or product.get("name", "")).lower()
+        name_hits = _match_keywords(index["name"], name)
+        super().__init__(
+            categories=categories,
+            category_set=frozenset(categories),
+            # Whole-text rules see the categories joined with spaces
+            category_text_hits=_match_keywords(index["categories"], " ".join(categories).lower()),
+            prepared_category_set=frozenset(
+                c.lower().strip() for c in product.get("Categories") or categories
+            ),
+            prepared_name_hits=(
+                name_hits if prepared_name == name else _match_keywords(index["name"], prepared_name)
+            ),
+            nutrients=product.get("nutrients", {}),
+            ingredients=product.get("ingredients", "").lower(),
+            name=name,
+            name_hits=name_hits,
+            barcode=str(product.get("barcode", "")),
+            source=product.get("source"),
+            source_meta=product.get("source_meta"),
+        )
+        self.index = index
+
+    def __missing__(self, key):
+        value = _LAZY_FEATURES[key](self)
+        self[key] = value
+        return value
+
+_LAZY_FEATURES = {
+    # Per-category rules must not match across category boundaries, and are case-sensitive
+    # ("en:Beverages" is not a beverage tag), unlike the whole-text category_text_hits
+    "category_hits": lambda f: _match_keywords(f.index["categories"], "\n".join(f["categories"])),
+    "ingredient_hits": lambda f: _match_keywords(f.index["ingredients"], f["ingredients"]),
+    "ingredient_count": lambda f: f["ingredients"].count(",") + 1,
+    "juice_percent": lambda f: estimate_juice_percent(f["ingredients"]),
+    "juice_percent_stated": lambda f: bool(_JUICE_PERCENT_RE.search(f["ingredients"])),
+}
+
+def extract_features(product: dict, index: dict) -> ProductFeatures:
+    """Normalize a product once for evaluation against any loaded policy."""
+    return ProductFeatures(product, index)
+
+# --- Rule tracing ---
+
+# Rule blocks of evaluate_policy(), in evaluation order
+RULES = (
+    "1_missing_data", "prepared_food", "2_vague_ingredients", "3_generic_category",
+    "4_banned_categories", "5_beverage_ban", "6_federal", "7_non_us_barcode", "8_confidence_threshold",
+)
+
+_stats_lock = threading.Lock()
+_rule_stats = {}  # state -> {"evaluations", "decided_by", "rules": {rule: {"fired", "evaluated", "total_ms"}}}
+
+class RuleTrace:
+    """Times consecutive rule blocks of one evaluation and records which ones fired."""
+
+    __slots__ = ("rules", "decided_by", "attach", "record", "_last")
+
+    def __init__(self, attach: bool = True, record: bool = True):
+        self.rules = {}
+        self.decided_by = None
+        self.attach = attach
+        self.record = record
+        self._last = time.perf_counter()
+
+    def mark(self, rule: str, fired: bool):
+        """Close the block that ran since the previous mark."""
+        now = time.perf_counter()
+        self.rules[rule] = (bool(fired), (now - self._last) * 1000)
+        self._last = now
+
+    def finish(self, state: str, result: dict, decided_by: str) -> dict:
+        """Fold the trace into the aggregate counters (if recording) and, if requested, attach it to the result."""
+        self.decided_by = decided_by
+        if self.attach:
+            result["trace"] = {
+                "state": state,
+                "decided_by": decided_by,
+                "rules": {rule: {"fired": fired, "ms": round(ms, 4)} for rule, (fired, ms) in self.rules.items()},
+            }
+        if not self.record:
+            return result
+        with _stats_lock:
+            stats = _rule_stats.setdefault(state, {"evaluations": 0, "decided_by": {}, "rules": {}})
+            stats["evaluations"] += 1
+            stats["decided_by"][decided_by] = stats["decided_by"].get(decided_by, 0) + 1
+            for rule, (fired, ms) in self.rules.items():
+                agg = stats["rules"].setdefault(rule, {"evaluated": 0, "fired": 0, "total_ms": 0.0})
+                agg["evaluated"] += 1
+                agg["fired"] += fired
+                agg["total_ms"] += ms
+        return result
+
+def rule_stats() -> dict:
+    """
+    Aggregate rule counters across all traced evaluations, per state: how often each
+    rule block ran and fired, its total and mean time, and which rule decided the outcome.
+    """
+    with _stats_lock:
+        out = {}
+        for state, stats in _rule_stats.items():
+            rules = {}
+            for rule in RULES:
+                agg = stats["rules"].get(rule)
+                if agg:
+                    rules[rule] = {
+                        **agg,
+                        "total_ms": round(agg["total_ms"], 3),
+                        "mean_ms": round(agg["total_ms"] / agg["evaluated"], 4),
+                    }
+            out[state] = {"evaluations": stats["evaluations"], "decided_by": dict(stats["decided_by"]), "rules": rules}
+        return out
+
+def reset_rule_stats():
+    with _stats_lock:
+        _rule_stats.clear()
+
+def _any_hit(keywords: frozenset, hits: frozenset) -> bool:
+    return not keywords.isdisjoint(hits)
+
+# Rules 3 and 7 read the stored inputs directly; policy_change_filter() reuses them
+def _generic_fires(policy: dict, categories: list) -> bool:
+    generic = policy["generic_category"]
+    return bool(categories) and len(categories) <= generic["max_categories"] and all(
+        kw in categories[0] for kw in generic["keywords"]
+    )
+
+def _foreign_barcode(policy: dict, barcode: str) -> bool:
+    return bool(barcode) and not barcode.startswith(policy["domestic_barcode_prefixes"])
+
+def evaluate_policy(policy: dict, f: dict, trace: RuleTrace = None) -> dict:
+    """
+    Determine EBT eligibility of pre-extracted product features under one state's policy.
+    Returns dict with eligible, reason, confidence, policy_version, user_tips, and confidence_reason,
+    plus a "trace" of the rule blocks that ran when a RuleTrace is passed.
+    """
+    pen = policy["penalties"]
+    categories = f["categories"]
+    nutrients = f["nutrients"]
+    ingredients = f["ingredients"]
+    barcode = f["barcode"]
 
     confidence = 1.0
     eligible = True
@@ -56,167 +342,394 @@ def check_eligibility(product: dict) -> dict:
     user_tips = []
     juice_potential = False
     confidence_reasons = []  # track explanations for reduced confidence
-
-    sensitive_cats = ("beverage", "drink", "candy", "dessert", "snack", "sweet")
-    category_text = " ".join(categories).lower()
+    decided_by = None  # rule block that set the current reason
 
     # --- 1️⃣ Missing data penalties ---
     if not categories:
-        confidence -= 0.25
+        confidence -= pen["missing_categories"]
         confidence_reasons.append("Missing categories")
-        user_tips.append("Check the product type — sodas and candies are not eligible, but staple foods are.")
-    if any(sc in category_text for sc in sensitive_cats):
+        user_tips.append(policy["missing_categories_tip"])
+    if _any_hit(policy["sensitive_category_keywords"], f["category_text_hits"]):
         if not nutrients:
-            confidence -= 0.15
+            confidence -= pen["missing_nutrients"]
             confidence_reasons.append("Missing nutrient data for sensitive category")
         if not ingredients:
-            confidence -= 0.10
+            confidence -= pen["missing_ingredients"]
             confidence_reasons.append("Missing ingredients for sensitive category")
         if not categories and not ingredients:
-            confidence -= 0.1
+            confidence -= pen["missing_categories_and_ingredients"]
             confidence_reasons.append("Both categories and ingredients missing")
     else:
         # For staples, missing fields are fine
         pass
-
-    if is_prepared_food(product):
-        confidence -= 0.15
+    if trace:
+        trace.mark("1_missing_data", confidence_reasons)
+
+    prepared = policy["prepared_food"]
+    is_prepared = not prepared["categories"].isdisjoint(f["prepared_category_set"]) or _any_hit(
+        prepared["name_keywords"], f["prepared_name_hits"]
+    )
+    if trace:
+        trace.mark("prepared_food", is_prepared)
+    if is_prepared:
+        confidence -= pen["prepared_food"]
         user_tips.append("Item may be sold hot or cold. If sold hot and ready to eat, it's not eligible for EBT.")
-        return {
+        result = {
             "eligible": None,
             "reason": "Item may be a hot prepared food; eligibility cannot be determined without knowing how it is sold.",
             "confidence": round(confidence, 2),
-            "policy_version": POLICY_VERSION,
+            "policy_version": policy["version"],
             "user_tips": user_tips
         }
+        return trace.finish(policy["state"], result, "prepared_food") if trace else result
 
     # --- 2️⃣ Ingredient ambiguity ---
-    if ingredients and len(ingredients.split(",")) < 3 and not any(
-        word in ingredients for word in ["sugar", "juice", "milk", "sweetener"]
-    ):
-        confidence -= 0.1
+    vague = policy["vague_ingredients"]
+    fired = ingredients and f["ingredient_count"] < vague["min_ingredients"] and not _any_hit(
+        vague["clarifying_keywords"], f["ingredient_hits"]
+    )
+    if fired:
+        confidence -= pen["vague_ingredients"]
         confidence_reasons.append("vague or minimal ingredient list")
         user_tips.append("Ingredient list is minimal or vague; verify the label for clarity.")
+    if trace:
+        trace.mark("2_vague_ingredients", fired)
 
     # --- 3️⃣ Category genericness ---
-    if categories and len(categories) <= 2 and all(
-        kw in categories[0] for kw in ["beverages", "foods"]
-    ):
-        confidence -= 0.05
+    fired = _generic_fires(policy, categories)
+    if fired:
+        confidence -= pen["generic_category"]
         confidence_reasons.append("Generic or broad category classification")
+    if trace:
+        trace.mark("3_generic_category", fired)
 
-    # --- 4️⃣ Idaho disallowed categories ---
-    banned_categories = {
-        "en:candies", "en:carbonated-soft-drinks", "en:energy-drinks",
-        "en:sweetened-beverages", "en:sugar-sweetened-beverages"
-    }
-
-    if any(cat in banned_categories for cat in categories):
+    # --- 4️⃣ State disallowed categories ---
+    banned = policy["banned_categories"]
+    fired = banned and not banned["categories"].isdisjoint(f["category_set"])
+    if fired:
         eligible = False
-        reason = "Candy, soda, or sweetened beverage not covered under Idaho SNAP (HB109)."
+        reason = banned["reason"]
+        decided_by = "4_banned_categories"
+    if trace:
+        trace.mark("4_banned_categories", fired)
 
-    # --- 5️⃣ Idaho 2026 sweetened beverage ban ---
-    if eligible and any("beverages" in cat or "drinks" in cat for cat in categories):
-        sweetener_keywords = [ 
-            "sugar", "corn syrup", "high fructose", "stevia", "sucralose",
-            "aspartame", "acesulfame", "monk fruit", "saccharin", "honey"
-        ]
-        has_sweetener = any(s in ingredients for s in sweetener_keywords)
+    # --- 5️⃣ State sweetened beverage ban ---
+    ban = policy["sweetened_beverage_ban"]
+    fired = ban and eligible and _any_hit(ban["beverage_category_keywords"], f["category_hits"])
+    if fired:
+        has_sweetener = _any_hit(ban["sweetener_keywords"], f["ingredient_hits"])
 
-        juice_percent = estimate_juice_percent(ingredients)
-        milk_based = any("milk" in cat for cat in categories)
-        mixable = any(word in name for word in ["mix", "powder", "concentrate"])
+        juice_percent = f["juice_percent"]
+        milk_based = _any_hit(ban["milk_category_keywords"], f["category_hits"])
+        mixable = _any_hit(ban["mixable_name_keywords"], f["name_hits"])
 
         juice_potential = False
+        juice_tip = (
+            "Juice estimate uncertain; check the label for exact juice content. "
+            f"If there's more than {ban['max_juice_percent']:g}% juice, it's eligible"
+        )
 
         if has_sweetener:
             # Coca-Cola Zero–like products
-            if "aspartame" in ingredients or "sucralose" in ingredients or "acesulfame" in ingredients:
-                confidence -= 0.1
+            if _any_hit(ban["artificial_sweetener_keywords"], f["ingredient_hits"]):
+                confidence -= pen["artificial_sweeteners"]
                 confidence_reasons.append("artificial sweeteners detected")
-            if not milk_based and juice_percent <= 50 and not mixable:
+            if not milk_based and juice_percent <= ban["max_juice_percent"] and not mixable:
                 eligible = False
-                reason = (
-                    "Banned under Idaho 2026 rule: sweetened nonalcoholic beverages not eligible "
-                    "unless >50% juice, milk-based, or mixable."
-                )
+                reason = ban["reason"]
+                decided_by = "5_beverage_ban"
         else:
             # Heuristic juice estimation
-            if "juice" in ingredients and not re.search(r'\d{1,3}\s*%', ingredients):
-                confidence -= 0.15
+            if "juice" in ingredients and not f["juice_percent_stated"]:
+                confidence -= pen["uncertain_juice"]
                 confidence_reasons.append("Juice mentioned but no % provided so estimate may be uncertain")
-                user_tips.append(
-                    "Juice estimate uncertain; check the label for exact juice content. "
-                    "If there's at least 50% juice, it's eligible"
-                )
+                user_tips.append(juice_tip)
                 juice_potential = True
 
             # Missing sugar data
             if not nutrients.get("total_sugars_g"):
                 eligible = None
-                confidence = min(confidence, 0.7)
+                confidence = min(confidence, ban["missing_sugar_confidence_cap"])
                 confidence_reasons.append("Missing sugar data for beverage")
                 reason = "Insufficient data to determine eligibility."
+                decided_by = "5_beverage_ban"
                 if not juice_potential:
                     user_tips.append(
                         "Check if this beverage contains natural or artificial sweeteners. If so, it is most likely not eligible."
                     )
 
-        if 40 <= juice_percent <= 60:
-            confidence -= 0.05
-            confidence_reasons.append("Potential borderline juice percentage (40–60%)")
-            user_tips.append(
-                    "Juice estimate uncertain; check the label for exact juice content. "
-                    "If there's at least 50% juice, it's eligible"
-            )
+        low, high = ban["borderline_juice_percent"]
+        if low <= juice_percent <= high:
+            confidence -= pen["borderline_juice"]
+            confidence_reasons.append(f"Potential borderline juice percentage ({low:g}–{high:g}%)")
+            user_tips.append(juice_tip)
+    if trace:
+        trace.mark("5_beverage_ban", fired)
 
     # --- 6️⃣ Federal disallowed items ---
-    federal_disallowed_keywords = ["alcohol", "supplement"]
-    federal_disallowed_categories = ["en:dietary-supplements"]
-    if any(f in name for f in federal_disallowed_keywords) or any(
-        c in categories for c in federal_disallowed_categories
-    ):
+    federal = policy["federal"]
+    fired = _any_hit(federal["name_keywords"], f["name_hits"]) or not federal["categories"].isdisjoint(
+        f["category_set"]
+    )
+    if fired:
         eligible = False
-        reason = "Federal rule: alcohol and supplements not eligible."
+        reason = federal["reason"]
+        decided_by = "6_federal"
+    if trace:
+        trace.mark("6_federal", fired)
 
     # --- 7️⃣ Non-US barcode → minor uncertainty
-    if barcode and not barcode.startswith(("0", "1")):
-        confidence -= 0.1
+    fired = _foreign_barcode(policy, barcode)
+    if fired:
+        confidence -= pen["non_us_barcode"]
         confidence_reasons.append("Non-U.S. barcode (potential data mismatch)")
         user_tips.append("Barcode may not correspond to a U.S. product; verify country of origin.")
+    if trace:
+        trace.mark("7_non_us_barcode", fired)
 
     # --- 8️⃣ Confidence threshold ---
-    if confidence < 0.6:
+    fired = confidence < policy["min_confidence"]
+    if trace:
+        trace.mark("8_confidence_threshold", fired)
+    if fired:
         filtered_reasons = [
             r for r in confidence_reasons
             if "non-u.s. barcode" not in r.lower() and "non-us barcode" not in r.lower()
         ]
-        return {
+        result = {
             "eligible": None,
             "reason": "Insufficient data to determine eligibility.",
             "confidence": round(confidence, 2),
             "confidence_reason": ", ".join(filtered_reasons) or "Incomplete or uncertain data",
-            "policy_version": POLICY_VERSION,
+            "policy_version": policy["version"],
             "user_tips": user_tips or ["Try scanning again or check the product label."],
-            "data_source": product.get("source"),
-            "source_meta": product.get("source_meta"),
+            "data_source": f["source"],
+            "source_meta": f["source_meta"],
         }
+        return trace.finish(policy["state"], result, "8_confidence_threshold") if trace else result
 
     filtered_reasons = [
         r for r in confidence_reasons
         if "non-u.s. barcode" not in r.lower() and "non-us barcode" not in r.lower()
     ]
-    return {
+    result = {
         "eligible": eligible,
-        "reason": reason or "Eligible under Idaho SNAP policy.",
+        "reason": reason or policy["eligible_reason"],
         "confidence": round(max(confidence, 0.0), 2),
         "confidence_reason": ", ".join(filtered_reasons) or "Full confidence",
-        "policy_version": POLICY_VERSION,
+        "policy_version": policy["version"],
         "user_tips": user_tips,
         # Echo back data origin if provided by the caller (e.g., "off" or "fdc")
-        "data_source": product.get("source"),
-        "source_meta": product.get("source_meta"),
+        "data_source": f["source"],
+        "source_meta": f["source_meta"],
+    }
+    return trace.finish(policy["state"], result, decided_by or "default") if trace else result
+
+def check_eligibility(product: dict, state: str = DEFAULT_STATE, trace: bool = False) -> dict:
+    """
+    Determine EBT eligibility of a product under one state's policy table
+    (Idaho HB109 + 2026 sweetened beverage ban by default).
+    Returns dict with eligible, reason, confidence, policy_version, user_tips, and confidence_reason.
+    With trace=True the result also has a "trace" of which rule blocks fired and
+    how long each took. Traced calls, and every call when EBT_TRACE=1, update rule_stats().
+    """
+    return check_eligibility_multi(product, [state], trace=trace)[state]
+
+def _policies_for(states) -> tuple:
+    """Loaded policies, feature index and the requested states (default: all); KeyError for an unknown state."""
+    load_policies()
+    policies, index = _policy_state[:2]
+    states = list(policies) if states is None else list(states)
+    for state in states:
+        if state not in policies:
+            raise KeyError(f"No eligibility policy for state {state!r}")
+    return policies, index, states
+
+def check_eligibility_multi(product: dict, states=None, trace: bool = False) -> dict:
+    """
+    Evaluate a product against several states' policies, extracting its features once.
+
+    Args:
+        product: dict in the check_eligibility() input shape
+        states: iterable of state codes (default: every loaded policy)
+        trace: attach a rule trace to each result (and update rule_stats())
+
+    Returns:
+        dict mapping state code to its check_eligibility() result
+    """
+    policies, index, states = _policies_for(states)
+    features = extract_features(product, index)
+    if not (trace or TRACE_ENABLED):
+        return {state: evaluate_policy(policies[state], features) for state in states}
+    return {state: evaluate_policy(policies[state], features, RuleTrace(attach=trace)) for state in states}
+
+
+# --- Incremental re-evaluation ---
+
+def check_eligibility_stored(product: dict, states=None) -> tuple:
+    """
+    Evaluate like check_eligibility_multi(), and also return what a stored result
+    needs for incremental re-evaluation after a policy change (see policy_change_filter()).
+
+    Returns:
+        tuple: (results, inputs, fingerprints). inputs are the normalized product
+        fields, a valid check_eligibility() input giving the same results;
+        fingerprints map each state to the policy version, the rule blocks that
+        fired, the deciding rule and the confidence.
+    """
+    policies, index, states = _policies_for(states)
+    f = extract_features(product, index)
+    results, fingerprints = {}, {}
+    for state in states:
+        trace = RuleTrace(attach=False, record=TRACE_ENABLED)
+        results[state] = result = evaluate_policy(policies[state], f, trace)
+        fingerprints[state] = {
+            "version": policies[state]["version"],
+            "fired": [rule for rule, (fired, _) in trace.rules.items() if fired],
+            "decided_by": trace.decided_by,
+            "confidence": result["confidence"],
+        }
+    inputs = {
+        "name": f["name"],
+        "categories": list(f["categories"]),
+        "ingredients": f["ingredients"],
+        "nutrients": f["nutrients"],
+        "barcode": f["barcode"],
     }
+    if f["source"] is not None or f["source_meta"] is not None:
+        inputs["source"], inputs["source_meta"] = f["source"], f["source_meta"]
+    return results, inputs, fingerprints
+
+# Which rule block applies each penalty
+_PENALTY_RULES = {
+    "missing_categories": "1_missing_data",
+    "missing_nutrients": "1_missing_data",
+    "missing_ingredients": "1_missing_data",
+    "missing_categories_and_ingredients": "1_missing_data",
+    "prepared_food": "prepared_food",
+    "vague_ingredients": "2_vague_ingredients",
+    "generic_category": "3_generic_category",
+    "artificial_sweeteners": "5_beverage_ban",
+    "uncertain_juice": "5_beverage_ban",
+    "borderline_juice": "5_beverage_ban",
+    "non_us_barcode": "7_non_us_barcode",
+}
+
+_BEVERAGE_BAN_SCALARS = ("max_juice_percent", "missing_sugar_confidence_cap", "borderline_juice_percent", "reason")
+
+# Fields that don't change any result beyond its policy_version stamp
+_POLICY_METADATA = {"state", "version", "program", "raw"}
+
+def policy_change_filter(old: dict, new: dict):
+    """
+    Compare two compiled policy tables for one state and build a predicate telling
+    whether a result stored under `old` may differ under `new`.
+
+    The predicate takes the (inputs, fingerprint) of a check_eligibility_stored()
+    result. It only scans stored fields for the keywords that were added or
+    removed, and checks the fingerprint for the rules whose scalars (penalties,
+    thresholds, reasons) changed. A product it rejects gets the same result under
+    `new`, apart from the policy_version stamp.
+
+    Returns:
+        the predicate, or None if no rule changed (a version bump only)
+    """
+    checks = []
+
+    def fired(rule):
+        checks.append(lambda i, fp: rule in fp["fired"])
+
+    def decided_by(rule):
+        checks.append(lambda i, fp: fp["decided_by"] == rule)
+
+    def text_hit(a, b, text):
+        delta = tuple((a or frozenset()) ^ (b or frozenset()))
+        if delta:
+            checks.append(lambda i, fp: any(k in text(i) for k in delta))
+
+    def set_hit(a, b, values):
+        delta = (a or frozenset()) ^ (b or frozenset())
+        if delta:
+            checks.append(lambda i, fp: not delta.isdisjoint(values(i)))
+
+    name = lambda i: i["name"]
+    ingredients = lambda i: i["ingredients"]
+    category_set = lambda i: set(i["categories"])
+
+    for key in (old.keys() | new.keys()) - _POLICY_METADATA:
+        a, b = old.get(key), new.get(key)
+        if a == b:
+            continue
+        if key == "eligible_reason":
+            decided_by("default")
+        elif key == "missing_categories_tip":
+            checks.append(lambda i, fp: not i["categories"])
+        elif key == "min_confidence":
+            # Rule 8 flips only for confidences between the two thresholds (stored rounded)
+            lo, hi = sorted((a, b))
+            checks.append(
+                lambda i, fp, lo=lo, hi=hi: fp["decided_by"] != "prepared_food" and lo - 0.01 <= fp["confidence"] < hi + 0.01
+            )
+        elif key == "penalties":
+            for k in a.keys() | b.keys():
+                if a.get(k) != b.get(k):
+                    if k in _PENALTY_RULES:
+                        fired(_PENALTY_RULES[k])
+                    else:
+                        checks.append(lambda i, fp: True)
+        elif key == "sensitive_category_keywords":
+            # Only matters for products missing nutrients or ingredients
+            delta = tuple(a ^ b)
+            checks.append(lambda i, fp, delta=delta: (not i["nutrients"] or not i["ingredients"]) and any(
+                k in " ".join(i["categories"]).lower() for k in delta
+            ))
+        elif key == "prepared_food":
+            text_hit(a["name_keywords"], b["name_keywords"], name)
+            set_hit(a["categories"], b["categories"], lambda i: {c.lower().strip() for c in i["categories"]})
+        elif key == "vague_ingredients":
+            text_hit(a["clarifying_keywords"], b["clarifying_keywords"], ingredients)
+            if a["min_ingredients"] != b["min_ingredients"]:
+                lo, hi = sorted((a["min_ingredients"], b["min_ingredients"]))
+                checks.append(
+                    lambda i, fp, lo=lo, hi=hi: bool(i["ingredients"]) and lo <= i["ingredients"].count(",") + 1 < hi
+                )
+        elif key == "generic_category":
+            checks.append(lambda i, fp: _generic_fires(old, i["categories"]) != _generic_fires(new, i["categories"]))
+        elif key == "banned_categories":
+            set_hit(a and a["categories"], b and b["categories"], category_set)
+            if a and b and a["reason"] != b["reason"]:
+                decided_by("4_banned_categories")
+        elif key == "sweetened_beverage_ban":
+            text_hit(
+                a and a["beverage_category_keywords"], b and b["beverage_category_keywords"],
+                lambda i: "\n".join(i["categories"]),
+            )
+            if a and b:
+                text_hit(a["sweetener_keywords"], b["sweetener_keywords"], ingredients)
+                text_hit(a["artificial_sweetener_keywords"], b["artificial_sweetener_keywords"], ingredients)
+                text_hit(a["milk_category_keywords"], b["milk_category_keywords"],
+                         lambda i: "\n".join(i["categories"]))
+                text_hit(a["mixable_name_keywords"], b["mixable_name_keywords"], name)
+                # The scalars only apply to products that passed the beverage gate
+                if any(a[k] != b[k] for k in _BEVERAGE_BAN_SCALARS):
+                    fired("5_beverage_ban")
+        elif key == "federal":
+            text_hit(a["name_keywords"], b["name_keywords"], name)
+            set_hit(a["categories"], b["categories"], category_set)
+            if a["reason"] != b["reason"]:
+                decided_by("6_federal")
+        elif key == "domestic_barcode_prefixes":
+            checks.append(lambda i, fp: _foreign_barcode(old, i["barcode"]) != _foreign_barcode(new, i["barcode"]))
+        else:
+            # A field this filter doesn't know: assume every result is affected
+            checks.append(lambda i, fp: True)
+
+    if not checks:
+        return None
+    return lambda inputs, fingerprint: any(check(inputs, fingerprint) for check in checks)
+
+
+load_policies()
 
 
 def format_off_product(product_info: dict) -> dict:
@@ -0,0 +1,160 @@
+"""
+Bring stored bulk_classify results up to date after a policy table change.
+
+Results written with `bulk_classify --with-inputs` carry each product's
+normalized inputs and, per state, a fingerprint of the rules that fired. Only
+products whose inputs or fingerprint intersect the changed rules (see
+policy_change_filter()) are evaluated again. Every other result just gets the
+new policy_version.
+
+The policies the results were computed under come from <input>.policies.json,
+written by bulk_classify, or from --old-policies (a snapshot file or a
+directory of policy tables). A snapshot of the current tables is written next
+to the output for the next run.
+
+Usage:
+    python -m eligibility.reevaluate results.jsonl -o results.new.jsonl
+    python -m eligibility.reevaluate results.jsonl -o results.jsonl --old-policies old_policies/
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from eligibility.bulk_classify import make_record, save_policy_snapshot
+from eligibility.ebt_eligibility import (
+    check_eligibility_stored, compile_policy, load_policies, policy_change_filter,
+)
+
+
+def load_policy_tables(path: str) -> dict:
+    """Compiled policy tables keyed by state, from a snapshot file or a directory of tables."""
+    p = Path(path)
+    if p.is_dir():
+        raws = []
+        for table in sorted(p.glob("*.json")):
+            with open(table, encoding="utf-8") as f:
+                raws.append(json.load(f))
+    else:
+        with open(p, encoding="utf-8") as f:
+            raws = list(json.load(f).values())
+    return {pol["state"]: pol for pol in map(compile_policy, raws)}
+
+
+def _split(record: dict) -> dict:
+    """Per-state results of a stored record, single-state records included."""
+    if "results" in record:
+        return record["results"]
+    (state,) = record["fingerprint"]
+    skip = {"row", "barcode", "name", "inputs", "fingerprint"}
+    return {state: {k: v for k, v in record.items() if k not in skip}}
+
+
+def reevaluate(input_path, output_path, old_policies=None, log=sys.stderr) -> dict:
+    """
+    Re-evaluate the stored results in input_path that the policy change may
+    affect, and write every result, updated, to output_path (may be the same file).
+
+    Returns:
+        counts of rows that were current, only restamped, re-evaluated, changed
+        (a re-evaluated result whose eligible or reason differs), and skipped
+        (stored without inputs, or error rows, copied as is)
+    """
+    old = load_policy_tables(old_policies or input_path + ".policies.json")
+    current = load_policies()
+    filters = {}
+    counts = {"rows": 0, "current": 0, "restamped": 0, "reevaluated": 0, "changed": 0, "skipped": 0}
+    states_seen = set()
+    started = time.monotonic()
+
+    tmp = output_path + ".tmp"
+    with open(input_path, encoding="utf-8") as src, open(tmp, "w", encoding="utf-8") as out:
+        for line in src:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            counts["rows"] += 1
+            inputs, fingerprints = record.get("inputs"), record.get("fingerprint")
+            if inputs is None or not fingerprints:
+                counts["skipped"] += 1
+                out.write(line if line.endswith("\n") else line + "\n")
+                continue
+
+            results = _split(record)
+            stale, restamp = [], []
+            for state, fp in fingerprints.items():
+                states_seen.add(state)
+                if state not in current:
+                    raise KeyError(f"No eligibility policy for state {state!r}")
+                new = current[state]
+                if fp["version"] == new["version"]:
+                    continue
+                base = old.get(state)
+                if base is None or base["version"] != fp["version"]:
+                    # Don't know what changed since this result was computed
+                    stale.append(state)
+                    continue
+                key = (state, fp["version"], new["version"])
+                if key not in filters:
+                    filters[key] = policy_change_filter(base, new)
+                affected = filters[key]
+                if affected is not None and affected(inputs, fp):
+                    stale.append(state)
+                else:
+                    restamp.append(state)
+
+            for state in restamp:
+                results[state]["policy_version"] = current[state]["version"]
+                fingerprints[state]["version"] = current[state]["version"]
+            if stale:
+                fresh, _, fresh_fps = check_eligibility_stored(inputs, stale)
+                for state in stale:
+                    before = results[state]
+                    if (before.get("eligible"), before.get("reason")) != (fresh[state]["eligible"], fresh[state]["reason"]):
+                        counts["changed"] += 1
+                    results[state] = fresh[state]
+                    fingerprints[state] = fresh_fps[state]
+                counts["reevaluated"] += 1
+            elif restamp:
+                counts["restamped"] += 1
+            else:
+                counts["current"] += 1
+
+            record = make_record(record["row"], record["barcode"], record["name"], results, inputs, fingerprints)
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, output_path)
+    save_policy_snapshot(output_path + ".policies.json", current, sorted(states_seen))
+
+    elapsed = time.monotonic() - started
+    print(
+        f"{counts['rows']} rows in {elapsed:.1f}s: {counts['reevaluated']} re-evaluated "
+        f"({counts['changed']} outcomes changed), {counts['restamped']} restamped, "
+        f"{counts['current']} already current, {counts['skipped']} skipped",
+        file=log,
+    )
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update stored eligibility results for a policy change.")
+    parser.add_argument("input", help="JSONL results from bulk_classify --with-inputs")
+    parser.add_argument("-o", "--output", required=True, help="updated JSONL results (may equal input)")
+    parser.add_argument("--old-policies",
+                        help="policy snapshot or directory the results were computed under "
+                             "(default: <input>.policies.json)")
+    args = parser.parse_args(argv)
+
+    try:
+        reevaluate(args.input, args.output, old_policies=args.old_policies)
+    except (KeyError, ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
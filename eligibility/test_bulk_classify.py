@@ -0,0 +1,90 @@
+import json
+
+import pytest
+from eligibility.bulk_classify import PolicyVersionChanged, classify_batch, run, load_checkpoint
+
+def _write_jsonl(path, rows):
+    path.write_text("".join(json.dumps(r) + "\n" for r in rows))
+
+
+def _read_jsonl(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_jsonl_in_order(tmp_path, catalog):
+    src, out = tmp_path / "catalog.jsonl", tmp_path / "out.jsonl"
+    _write_jsonl(src, catalog * 5)
+    run(str(src), str(out), ["ID"], workers=1, batch_size=4, log=None)
+    results = _read_jsonl(out)
+    assert [r["row"] for r in results] == list(range(len(catalog) * 5))
+    assert results[1]["eligible"] is False
+    assert results[2]["eligible"] is True
+
+
+def test_csv_multi_state(tmp_path):
+    src, out = tmp_path / "catalog.csv", tmp_path / "out.jsonl"
+    src.write_text(
+        "Barcode,Name,Categories,Ingredients,Sugar (g)\n"
+        '0049000000443,Coca-Cola Classic,en:carbonated-soft-drinks,"carbonated water, sugar",39\n'
+    )
+    run(str(src), str(out), ["ID", "US"], workers=1, log=None)
+    (result,) = _read_jsonl(out)
+    assert result["results"]["ID"]["eligible"] is False
+    assert result["results"]["US"]["eligible"] is True
+
+
+def test_bad_row_reported(tmp_path, catalog):
+    src, out = tmp_path / "catalog.jsonl", tmp_path / "out.jsonl"
+    src.write_text(json.dumps(catalog[0]) + "\n{broken\n")
+    run(str(src), str(out), ["ID"], workers=1, log=None)
+    results = _read_jsonl(out)
+    assert "error" not in results[0]
+    assert results[1]["row"] == 1 and "error" in results[1]
+
+
+def test_resume_after_crash(tmp_path, catalog):
+    src, out = tmp_path / "catalog.jsonl", tmp_path / "out.jsonl"
+    _write_jsonl(src, catalog * 4)
+    run(str(src), str(out), ["ID"], workers=1, batch_size=4, log=None)
+    expected = out.read_text()
+
+    # Simulate a crash after the first batch: checkpoint at 4 rows plus a torn write
+    ckpt = load_checkpoint(str(out) + ".ckpt")
+    first_batch = "".join(expected.splitlines(keepends=True)[:4])
+    ckpt.update(rows_done=4, output_bytes=len(first_batch.encode()))
+    (tmp_path / "out.jsonl.ckpt").write_text(json.dumps(ckpt))
+    out.write_text(first_batch + '{"row": 4, "trunc')
+
+    run(str(src), str(out), ["ID"], workers=1, batch_size=4, log=None)
+    assert out.read_text() == expected
+
+
+def test_process_pool_matches_single_worker(tmp_path, catalog):
+    src = tmp_path / "catalog.jsonl"
+    _write_jsonl(src, catalog * 10)
+    single, pooled = tmp_path / "single.jsonl", tmp_path / "pooled.jsonl"
+    run(str(src), str(single), ["ID", "US"], workers=1, batch_size=3, log=None)
+    run(str(src), str(pooled), ["ID", "US"], workers=2, batch_size=3, log=None)
+    assert pooled.read_text() == single.read_text()
+    assert load_checkpoint(str(pooled) + ".ckpt")["rows_done"] == len(catalog) * 10
+
+
+def test_resume_refuses_changed_policy_version(tmp_path, catalog):
+    src, out = tmp_path / "catalog.jsonl", tmp_path / "out.jsonl"
+    _write_jsonl(src, catalog * 4)
+    run(str(src), str(out), ["ID"], workers=1, batch_size=4, log=None)
+
+    # A checkpoint left by a run under an older policy table
+    ckpt = load_checkpoint(str(out) + ".ckpt")
+    ckpt.update(rows_done=4, policy_versions={"ID": "ID-older"})
+    (tmp_path / "out.jsonl.ckpt").write_text(json.dumps(ckpt))
+    with pytest.raises(ValueError, match="policy versions"):
+        run(str(src), str(out), ["ID"], workers=1, batch_size=4, log=None)
+    run(str(src), str(out), ["ID"], workers=1, batch_size=4, restart=True, log=None)
+    assert len(_read_jsonl(out)) == len(catalog) * 4
+
+
+def test_reload_mid_run_is_an_error(catalog):
+    batch = [(0, json.dumps(catalog[0]))]
+    with pytest.raises(PolicyVersionChanged):
+        classify_batch(batch, ["ID"], versions={"ID": "ID-older"})
@@ -1,5 +1,5 @@
 import pytest
-from ebt_eligibility import check_eligibility
+from eligibility.ebt_eligibility import check_eligibility
 
 def run(item):
     return check_eligibility(item)
@@ -0,0 +1,108 @@
+import json
+
+import pytest
+from eligibility import ebt_eligibility
+from eligibility.ebt_eligibility import check_eligibility, check_eligibility_multi, load_policies
+
+SODA = {
+    "name": "Coca-Cola Classic Soda",
+    "categories": ["en:carbonated-soft-drinks"],
+    "ingredients": "carbonated water, high fructose corn syrup, caffeine, caramel color",
+    "nutrients": {"added_sugars_g": 39},
+}
+
+
+def test_multi_state_single_pass():
+    results = check_eligibility_multi(SODA, ["ID", "US"])
+    assert results["ID"]["eligible"] is False
+    assert results["ID"]["policy_version"] == ebt_eligibility.POLICY_VERSION
+    assert results["US"]["eligible"] is True
+    assert results["US"]["policy_version"].startswith("US-")
+
+
+def test_multi_state_matches_single_state():
+    assert check_eligibility_multi(SODA)["ID"] == check_eligibility(SODA)
+
+
+def test_unknown_state():
+    with pytest.raises(KeyError):
+        check_eligibility(SODA, state="ZZ")
+
+
+def test_hot_reload(policy_dir):
+    table = json.loads((policy_dir / "ID.json").read_text())
+    table["version"] = "ID-test-reload"
+    table["banned_categories"]["categories"] = []
+    table["sweetened_beverage_ban"] = None
+    (policy_dir / "ID.json").write_text(json.dumps(table))
+
+    load_policies(force=True)
+    result = check_eligibility(SODA)
+    assert result["eligible"] is True
+    assert result["policy_version"] == "ID-test-reload"
+
+
+def test_bad_reload_keeps_previous_tables(policy_dir):
+    version = ebt_eligibility.POLICY_VERSION
+    (policy_dir / "ID.json").write_text("{not json")
+    load_policies(force=True)
+    assert check_eligibility(SODA)["policy_version"] == version
+
+
+def test_trace_records_rules_and_aggregates():
+    ebt_eligibility.reset_rule_stats()
+    result = check_eligibility(SODA, trace=True)
+    trace = result["trace"]
+    assert trace["decided_by"] == "4_banned_categories"
+    assert trace["rules"]["4_banned_categories"]["fired"] is True
+    assert trace["rules"]["6_federal"]["fired"] is False
+    assert all(r["ms"] >= 0 for r in trace["rules"].values())
+
+    untraced = check_eligibility(SODA)
+    assert "trace" not in untraced
+    assert {k: v for k, v in result.items() if k != "trace"} == untraced
+
+    stats = ebt_eligibility.rule_stats()["ID"]
+    assert stats["evaluations"] == 1
+    assert stats["decided_by"] == {"4_banned_categories": 1}
+    assert stats["rules"]["4_banned_categories"]["fired"] == 1
+
+
+def test_prepared_food_trace_stops_early():
+    result = check_eligibility({"name": "Rotisserie Chicken", "categories": ["en:prepared-meals"]}, trace=True)
+    assert result["trace"]["decided_by"] == "prepared_food"
+    assert "8_confidence_threshold" not in result["trace"]["rules"]
+
+
+def test_beverage_gate_is_case_sensitive_per_category():
+    # As in the original rules: per-category beverage/milk checks match tags exactly,
+    # while the sensitive-category check sees lowercased text
+    lemonade = {
+        "name": "Lemonade",
+        "ingredients": "water, sugar, lemon juice",
+        "nutrients": {"total_sugars_g": 20},
+    }
+    mixed = check_eligibility({**lemonade, "categories": ["en:Beverages"]}, trace=True)
+    assert mixed["trace"]["rules"]["5_beverage_ban"]["fired"] is False
+    assert mixed["eligible"] is True
+    assert check_eligibility({**lemonade, "categories": ["en:beverages"]})["eligible"] is False
+
+
+def test_user_text_follows_policy_table(policy_dir):
+    uncategorized = {"name": "Snack Bar", "categories": [], "ingredients": "oats, honey, almonds"}
+    assert not any("soda" in tip for tip in check_eligibility(uncategorized, "US")["user_tips"])
+    assert any("soda" in tip for tip in check_eligibility(uncategorized, "ID")["user_tips"])
+
+    table = json.loads((policy_dir / "ID.json").read_text())
+    table["sweetened_beverage_ban"].update(max_juice_percent=60, borderline_juice_percent=[50, 70])
+    (policy_dir / "ID.json").write_text(json.dumps(table))
+    load_policies(force=True)
+    nectar = {
+        "name": "Mango Nectar",
+        "categories": ["en:beverages"],
+        "ingredients": "water, mango puree, 55% juice from concentrate",
+        "nutrients": {"total_sugars_g": 12},
+    }
+    result = check_eligibility(nectar, "ID")
+    assert "Potential borderline juice percentage (50–70%)" in result["confidence_reason"]
+    assert any("more than 60% juice" in tip for tip in result["user_tips"])
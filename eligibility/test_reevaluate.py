@@ -0,0 +1,73 @@
+import json
+
+import pytest
+from eligibility.bulk_classify import run
+from eligibility.ebt_eligibility import load_policies
+from eligibility.reevaluate import reevaluate
+
+
+def _edit(policy_dir, state, change):
+    path = policy_dir / f"{state}.json"
+    table = json.loads(path.read_text())
+    change(table)
+    table["version"] += "-next"
+    path.write_text(json.dumps(table))
+    load_policies(force=True)
+
+
+def _classify(tmp_path, catalog, name, states):
+    src, out = tmp_path / "catalog.jsonl", tmp_path / name
+    src.write_text("".join(json.dumps(r) + "\n" for r in catalog))
+    run(str(src), str(out), states, workers=1, restart=True, with_inputs=True, log=None)
+    return out
+
+
+CHANGES = {
+    "version_only": lambda t: None,
+    "banned_category_added": lambda t: t["banned_categories"]["categories"].append("en:sodas"),
+    "sweetener_added": lambda t: t["sweetened_beverage_ban"]["sweetener_keywords"].append("agave"),
+    "juice_threshold": lambda t: t["sweetened_beverage_ban"].update(max_juice_percent=20),
+    "beverage_ban_dropped": lambda t: t.update(sweetened_beverage_ban=None),
+    "min_confidence": lambda t: t.update(min_confidence=0.8),
+    "penalty": lambda t: t["penalties"].update(non_us_barcode=0.5),
+    "prepared_keyword": lambda t: t["prepared_food"]["name_keywords"].append("gummies"),
+    "min_ingredients": lambda t: t["vague_ingredients"].update(min_ingredients=4),
+    "sensitive_keyword": lambda t: t["sensitive_category_keywords"].append("cereal"),
+    "generic_category": lambda t: t["generic_category"].update(max_categories=1),
+    "federal_reason": lambda t: t["federal"].update(reason="Not eligible."),
+    "domestic_prefixes": lambda t: t.update(domestic_barcode_prefixes=["0", "1", "5"]),
+    "missing_categories_tip": lambda t: t.update(missing_categories_tip="Check the product type."),
+}
+
+
+@pytest.mark.parametrize("change", list(CHANGES))
+def test_incremental_matches_full_run(tmp_path, catalog, policy_dir, change):
+    stored = _classify(tmp_path, catalog, "stored.jsonl", ["ID", "US"])
+    _edit(policy_dir, "ID", CHANGES[change])
+
+    updated = tmp_path / "updated.jsonl"
+    counts = reevaluate(str(stored), str(updated), log=None)
+    expected = _classify(tmp_path, catalog, "full.jsonl", ["ID", "US"])
+    assert updated.read_text() == expected.read_text()
+    assert counts["rows"] == len(catalog)
+    assert counts["reevaluated"] < len(catalog)
+
+
+def test_version_bump_only_restamps(tmp_path, catalog, policy_dir):
+    stored = _classify(tmp_path, catalog, "stored.jsonl", ["ID"])
+    _edit(policy_dir, "ID", CHANGES["version_only"])
+    counts = reevaluate(str(stored), str(stored), log=None)
+    assert counts["restamped"] == len(catalog) and counts["reevaluated"] == 0
+    assert all(json.loads(line)["policy_version"].endswith("-next") for line in stored.read_text().splitlines())
+
+    # The new snapshot makes the next run a no-op
+    counts = reevaluate(str(stored), str(stored), log=None)
+    assert counts["current"] == len(catalog)
+
+
+def test_targeted_change_reevaluates_few(tmp_path, catalog, policy_dir):
+    stored = _classify(tmp_path, catalog, "stored.jsonl", ["ID"])
+    _edit(policy_dir, "ID", CHANGES["sweetener_added"])
+    counts = reevaluate(str(stored), str(tmp_path / "updated.jsonl"), log=None)
+    assert counts["reevaluated"] == 1
+    assert counts["changed"] == 1
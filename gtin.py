@@ -0,0 +1,84 @@
+import re
+
+# GS1 barcodes we accept: EAN-8, UPC-A (12), EAN-13 and GTIN-14.
+GTIN_LENGTHS = (8, 12, 13, 14)
+
+_NON_DIGITS = re.compile(r"[\s\-]")
+
+
+def gtin_check_digit(body: str) -> int:
+    """Compute the GS1 mod-10 check digit for a string of digits (without the check digit)."""
+    total = 0
+    # Weights alternate 3, 1, 3, ... starting from the rightmost digit of the body
+    for i, ch in enumerate(reversed(body)):
+        total += int(ch) * (3 if i % 2 == 0 else 1)
+    return (10 - total % 10) % 10
+
+
+def expand_upce(code: str) -> str | None:
+    """
+    Expand a zero-suppressed UPC-E code (8 digits, number system 0 or 1)
+    into its 12-digit UPC-A equivalent. Returns None if it is not UPC-E.
+    """
+    if len(code) != 8 or not code.isdigit() or code[0] not in "01":
+        return None
+    ns, d, check = code[0], code[1:7], code[7]
+    last = d[5]
+    if last in "012":
+        body = d[0:2] + last + "0000" + d[2:5]
+    elif last == "3":
+        body = d[0:3] + "00000" + d[3:5]
+    elif last == "4":
+        body = d[0:4] + "00000" + d[4]
+    else:
+        body = d[0:5] + "0000" + last
+    upca = ns + body + check
+    if gtin_check_digit(upca[:-1]) != int(check):
+        return None
+    return upca
+
+
+def normalize_gtin(code, upce: bool | None = None) -> str | None:
+    """
+    Parse a scanned or typed barcode and return its canonical GTIN-14 form.
+
+    UPC-A `025000040801`, EAN-13 `0025000040801` and GTIN-14 `00025000040801`
+    all normalize to `00025000040801`. 8 digits are read as EAN-8, or as UPC-E
+    when they fail the EAN-8 check: phone scanners send UPC-E (US cans and small
+    packs) as 8 digits. Set `upce` to True or False when the symbology is known.
+
+    Returns None if the code has the wrong length or a bad check digit.
+    """
+    if code is None:
+        return None
+    text = _NON_DIGITS.sub("", str(code))
+    if not text.isdigit():
+        return None
+    if upce:
+        text = expand_upce(text)
+        if text is None:
+            return None
+    elif upce is None and len(text) == 8 and gtin_check_digit(text[:-1]) != int(text[-1]):
+        text = expand_upce(text) or text
+    if len(text) not in GTIN_LENGTHS:
+        return None
+    if gtin_check_digit(text[:-1]) != int(text[-1]):
+        return None
+    return text.zfill(14)
+
+
+def is_valid_gtin(code, upce: bool | None = None) -> bool:
+    """Return True if the code parses as a GTIN with a correct check digit."""
+    return normalize_gtin(code, upce=upce) is not None
+
+
+def to_off_code(gtin14: str) -> str:
+    """
+    Convert a canonical GTIN-14 into the code OpenFoodFacts indexes products under:
+    EAN-8 stays 8 digits, everything else is sent as 13 digits.
+    """
+    if gtin14.startswith("000000"):
+        return gtin14[-8:]
+    if gtin14.startswith("0"):
+        return gtin14[1:]
+    return gtin14
@@ -0,0 +1,148 @@
+"""
+Local stand-in for the OpenFoodFacts product API, for offline load testing.
+
+Serves `GET /api/v0/product/<code>.json` and `GET /api/v2/product/<code>[.json]`
+in the OFF response shapes: fixtures from fixtures/off_products.json, plus
+deterministic synthetic products for any other code. Latency, error, hang and
+not-found rates are configurable; not-found only applies to non-fixture codes.
+
+Usage:
+    python -m loadtest.fake_off --port 9000 --latency-ms 80 --jitter-ms 40 --error-rate 0.02
+    OFF_BASE_URLS=http://127.0.0.1:9000 uvicorn main:app --workers 4
+"""
+
+import argparse
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import random
+import re
+from pathlib import Path
+
+from loadtest.httpio import encode_response, read_request
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "off_products.json"
+
+_PRODUCT_PATH = re.compile(r"^/api/(v0|v2)/product/(\d+)(?:\.json)?$")
+
+
+def _code_fraction(code: str) -> float:
+    """Stable pseudo-random value in [0, 1) per barcode."""
+    return int.from_bytes(hashlib.blake2b(code.encode(), digest_size=4).digest(), "big") / 2**32
+
+
+class FakeOFF:
+    def __init__(self, fixtures=FIXTURES, latency_ms=50.0, jitter_ms=0.0, error_rate=0.0,
+                 not_found_rate=0.0, hang_rate=0.0, hang_seconds=30.0, synthesize=True, seed=None):
+        with open(fixtures, encoding="utf-8") as f:
+            self.templates = json.load(f)
+        self.products = {p["code"]: p for p in self.templates}
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.not_found_rate = not_found_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.synthesize = synthesize
+        self.random = random.Random(seed)
+        self.counts = {"requests": 0, "found": 0, "not_found": 0, "errors": 0, "hangs": 0}
+
+    def lookup(self, code: str):
+        """Return the product for a code, or None if it should be 'not found'."""
+        product = self.products.get(code) or self.products.get(code.zfill(13))
+        if product is not None:
+            return product
+        # Not-found applies to non-fixture codes and is decided per code, so repeated lookups agree
+        if self.synthesize and _code_fraction(code) >= self.not_found_rate:
+            product = copy.deepcopy(self.templates[int(_code_fraction(code[::-1]) * len(self.templates))])
+            product["code"] = code
+            product["product_name"] = f"{product['product_name']} #{code[-5:]}"
+            product["rev"] = 1
+        return product
+
+    async def handle(self, method: str, target: str):
+        """Returns (status, body)."""
+        self.counts["requests"] += 1
+        path = target.split("?", 1)[0]
+        if path == "/__stats":
+            return 200, json.dumps(self.counts).encode()
+        match = _PRODUCT_PATH.match(path)
+        if method != "GET" or not match:
+            return 404, b'{"status": 0, "status_verbose": "no route"}'
+        version, code = match.groups()
+
+        roll = self.random.random()
+        if roll < self.hang_rate:
+            self.counts["hangs"] += 1
+            await asyncio.sleep(self.hang_seconds)
+        else:
+            await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+        if self.hang_rate <= roll < self.hang_rate + self.error_rate:
+            self.counts["errors"] += 1
+            return self.random.choice((500, 502, 503)), b'{"error": "upstream unavailable"}'
+
+        product = self.lookup(code)
+        if product is None:
+            self.counts["not_found"] += 1
+            body = {"code": code, "status": 0, "status_verbose": "product not found"}
+            # v0 reports not-found in the body with HTTP 200; v2 also uses 404
+            return (404 if version == "v2" else 200), json.dumps(body).encode()
+        self.counts["found"] += 1
+        body = {"code": code, "product": product, "status": 1, "status_verbose": "product found"}
+        return 200, json.dumps(body).encode()
+
+    async def serve_connection(self, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, _ = request
+                status, body = await self.handle(method, target)
+                writer.write(encode_response(status, body))
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=9000):
+        return await asyncio.start_server(self.serve_connection, host, port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake OpenFoodFacts API for load testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("FAKE_OFF_PORT") or 9000))
+    parser.add_argument("--fixtures", default=str(FIXTURES), help="JSON list of OFF product objects")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="uniform +/- jitter on latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 5xx")
+    parser.add_argument("--not-found-rate", type=float, default=0.0, help="fraction of barcodes that are unknown")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="fraction of requests that stall")
+    parser.add_argument("--hang-seconds", type=float, default=30.0, help="how long stalled requests take")
+    parser.add_argument("--no-synthesize", action="store_true", help="serve only fixture barcodes")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    fake = FakeOFF(args.fixtures, args.latency_ms, args.jitter_ms, args.error_rate, args.not_found_rate,
+                   args.hang_rate, args.hang_seconds, not args.no_synthesize, args.seed)
+
+    async def run():
+        server = await fake.start(args.host, args.port)
+        print(f"Fake OpenFoodFacts listening on http://{args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print(json.dumps(fake.counts))
+
+
+if __name__ == "__main__":
+    main()
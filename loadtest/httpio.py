@@ -0,0 +1,98 @@
+"""
+Minimal HTTP/1.1 over asyncio streams, shared by the fake OpenFoodFacts server
+and the load generator. Supports keep-alive, Content-Length and chunked bodies;
+enough to talk to uvicorn and to ourselves without third-party clients.
+"""
+
+import asyncio
+from urllib.parse import urlsplit
+
+REASONS = {200: "OK", 304: "Not Modified", 404: "Not Found", 500: "Internal Server Error",
+           502: "Bad Gateway", 503: "Service Unavailable"}
+
+
+async def _read_headers(reader: asyncio.StreamReader) -> dict:
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("connection closed while reading headers")
+        if line in (b"\r\n", b"\n"):
+            return headers
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+
+async def _read_body(reader: asyncio.StreamReader, headers: dict) -> bytes:
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip(), 16)
+            if size == 0:
+                await _read_headers(reader)  # trailers
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+    length = int(headers.get("content-length") or 0)
+    return await reader.readexactly(length) if length else b""
+
+
+async def read_request(reader: asyncio.StreamReader):
+    """Read one request. Returns (method, target, headers, body), or None on a clean close."""
+    line = await reader.readline()
+    if not line:
+        return None
+    method, target, _ = line.decode("latin-1").split(" ", 2)
+    headers = await _read_headers(reader)
+    body = await _read_body(reader, headers)
+    return method, target, headers, body
+
+
+def encode_response(status: int, body: bytes = b"", content_type: str = "application/json",
+                    headers: dict = None) -> bytes:
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}",
+             f"Content-Type: {content_type}", f"Content-Length: {len(body)}"]
+    lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+class Connection:
+    """A keep-alive client connection to one host, reopened when the server closes it."""
+
+    def __init__(self, base_url: str):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self._reader = self._writer = None
+
+    async def request(self, method: str, path: str, body: bytes = b"", headers: dict = None):
+        """Send one request. Returns (status, headers, body)."""
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}",
+                 f"Content-Length: {len(body)}"]
+        lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        try:
+            self._writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+            await self._writer.drain()
+            status_line = await self._reader.readline()
+            if not status_line:
+                raise ConnectionError("connection closed by server")
+            status = int(status_line.split()[1])
+            resp_headers = await _read_headers(self._reader)
+            resp_body = b"" if status == 304 or method == "HEAD" else await _read_body(self._reader, resp_headers)
+        except BaseException:
+            await self.close()
+            raise
+        if resp_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, resp_headers, resp_body
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        self._reader = self._writer = None
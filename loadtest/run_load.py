@@ -0,0 +1,226 @@
+"""
+Async load generator for the barcode/eligibility API.
+
+Drives /eligibility/{barcode}, the detection endpoints, /health, or a weighted
+mix of them at a fixed concurrency and, optionally, a fixed request rate, then
+reports throughput, latency percentiles and error rates per route.
+
+With --rate, latency is measured from each request's scheduled start rather
+than its actual send time, so a stalled server cannot hide its queueing delay
+(coordinated omission).
+
+Usage:
+    python -m loadtest.fake_off --latency-ms 80 &
+    OFF_BASE_URLS=http://127.0.0.1:9000 uvicorn main:app --workers 4 &
+    python -m loadtest.run_load --mix eligibility=8,detect-base64=1,health=1 --concurrency 64 --duration 30
+"""
+
+import argparse
+import asyncio
+import base64
+import glob
+import json
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from gtin import gtin_check_digit
+from loadtest.fake_off import FIXTURES
+from loadtest.httpio import Connection
+
+ROOT = Path(__file__).resolve().parent.parent
+ROUTES = ("eligibility", "detect", "detect-base64", "health")
+
+
+def parse_mix(text: str) -> dict:
+    """Parse 'eligibility=8,detect=1' into route weights."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise ValueError(f"Unknown route {name!r}; choose from {', '.join(ROUTES)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+class Workload:
+    """Builds requests: barcodes from fixtures or fresh random GTINs, images from disk."""
+
+    def __init__(self, mix, images, unique_fraction=0.0, invalid_fraction=0.0, seed=None):
+        self.routes = list(mix)
+        self.weights = [mix[r] for r in self.routes]
+        self.random = random.Random(seed)
+        self.unique_fraction = unique_fraction
+        self.invalid_fraction = invalid_fraction
+        with open(FIXTURES, encoding="utf-8") as f:
+            self.barcodes = [p["code"] for p in json.load(f)]
+        self.images = [(Path(p).name, Path(p).read_bytes()) for p in images]
+        self.base64_bodies = [
+            json.dumps({"image": base64.b64encode(data).decode()}).encode() for _, data in self.images
+        ]
+        if not self.images and ({"detect", "detect-base64"} & set(self.routes)):
+            raise ValueError("Detection routes need at least one --images file")
+
+    def _barcode(self) -> str:
+        roll = self.random.random()
+        if roll < self.invalid_fraction:
+            body = "0" + "".join(self.random.choice("0123456789") for _ in range(11))
+            return body + str((gtin_check_digit(body) + 1) % 10)
+        if roll < self.invalid_fraction + self.unique_fraction:
+            body = "0" + "".join(self.random.choice("0123456789") for _ in range(11))
+            return body + str(gtin_check_digit(body))
+        return self.random.choice(self.barcodes)
+
+    def next_request(self):
+        """Returns (route, method, path, body, headers)."""
+        route = self.random.choices(self.routes, self.weights)[0]
+        if route == "eligibility":
+            return route, "GET", f"/eligibility/{self._barcode()}", b"", {}
+        if route == "health":
+            return route, "GET", "/health", b"", {}
+        i = self.random.randrange(len(self.images))
+        if route == "detect-base64":
+            return route, "POST", "/detect-barcode-base64", self.base64_bodies[i], {
+                "Content-Type": "application/json"}
+        filename, data = self.images[i]
+        boundary = uuid.uuid4().hex
+        body = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: image/jpeg\r\n\r\n"
+        ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+        return route, "POST", "/detect-barcode", body, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+async def run_load(target, workload, concurrency=16, rate=0.0, duration=10.0, max_requests=None, timeout=30.0):
+    """
+    Run the load test and return the raw samples as (route, status, latency_s) tuples;
+    status is None for transport errors and timeouts.
+    """
+    samples = []
+    started = time.monotonic()
+    deadline = started + duration
+    issued = 0
+
+    def next_slot():
+        """Scheduled start time of the next request, or None when the run is over."""
+        nonlocal issued
+        if max_requests is not None and issued >= max_requests:
+            return None
+        slot = started + issued / rate if rate > 0 else time.monotonic()
+        if slot >= deadline:
+            return None
+        issued += 1
+        return slot
+
+    async def worker():
+        conn = Connection(target)
+        try:
+            while True:
+                slot = next_slot()
+                if slot is None:
+                    return
+                delay = slot - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                route, method, path, body, headers = workload.next_request()
+                sent = time.monotonic()
+                try:
+                    status, _, _ = await asyncio.wait_for(conn.request(method, path, body, headers), timeout)
+                except (asyncio.TimeoutError, ConnectionError, OSError, ValueError, asyncio.IncompleteReadError):
+                    status = None
+                samples.append((route, status, time.monotonic() - (slot if rate > 0 else sent)))
+        finally:
+            await conn.close()
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return samples, time.monotonic() - started
+
+
+def summarize(samples, elapsed) -> dict:
+    """Throughput, error rate, status counts and latency percentiles, per route and overall."""
+    groups = {"all": samples}
+    for route, status, latency in samples:
+        groups.setdefault(route, []).append((route, status, latency))
+    report = {}
+    for name, group in groups.items():
+        latencies = sorted(s[2] * 1000 for s in group)
+        statuses = {}
+        for _, status, _ in group:
+            key = str(status) if status is not None else "transport_error"
+            statuses[key] = statuses.get(key, 0) + 1
+        errors = sum(1 for _, status, _ in group if status is None or status >= 500)
+        report[name] = {
+            "requests": len(group),
+            "throughput_rps": round(len(group) / elapsed, 1) if elapsed else 0.0,
+            "error_rate": round(errors / len(group), 4) if group else 0.0,
+            "statuses": statuses,
+            "latency_ms": {
+                "p50": round(percentile(latencies, 0.50), 2),
+                "p90": round(percentile(latencies, 0.90), 2),
+                "p95": round(percentile(latencies, 0.95), 2),
+                "p99": round(percentile(latencies, 0.99), 2),
+                "max": round(latencies[-1], 2) if latencies else 0.0,
+            },
+        }
+    return report
+
+
+def print_report(report, elapsed, out=sys.stdout):
+    print(f"Duration: {elapsed:.1f}s", file=out)
+    print(f"{'route':<15}{'reqs':>8}{'rps':>9}{'err%':>8}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}  statuses", file=out)
+    for name, r in report.items():
+        lat = r["latency_ms"]
+        statuses = " ".join(f"{k}:{v}" for k, v in sorted(r["statuses"].items()))
+        print(f"{name:<15}{r['requests']:>8}{r['throughput_rps']:>9}{r['error_rate'] * 100:>7.2f}%"
+              f"{lat['p50']:>9}{lat['p90']:>9}{lat['p99']:>9}{lat['max']:>9}  {statuses}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the barcode/eligibility API.")
+    parser.add_argument("--target", default="http://127.0.0.1:8000", help="API base URL")
+    parser.add_argument("--mix", default="eligibility=1",
+                        help=f"weighted routes, e.g. eligibility=8,detect-base64=1,health=1 ({', '.join(ROUTES)})")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent connections")
+    parser.add_argument("--rate", type=float, default=0.0, help="target requests/s (0 = as fast as possible)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--requests", type=int, default=None, help="stop after this many requests")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument("--unique-fraction", type=float, default=0.0,
+                        help="fraction of eligibility lookups using fresh random GTINs (cache misses)")
+    parser.add_argument("--invalid-fraction", type=float, default=0.0,
+                        help="fraction of eligibility lookups with a bad check digit")
+    parser.add_argument("--images", nargs="*", default=None,
+                        help="images for detection routes (default: ex_image/*)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    images = args.images
+    if images is None:
+        images = sorted(glob.glob(str(ROOT / "ex_image" / "*")))
+    try:
+        workload = Workload(parse_mix(args.mix), images, args.unique_fraction, args.invalid_fraction, args.seed)
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    samples, elapsed = asyncio.run(run_load(
+        args.target, workload, args.concurrency, args.rate, args.duration, args.requests, args.timeout))
+    report = summarize(samples, elapsed)
+    print_report(report, elapsed)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "elapsed_s": round(elapsed, 3), "report": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
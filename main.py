@@ -1,16 +1,32 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
 import requests
 import cv2
 import numpy as np
 from PIL import Image
 import io
+import logging
+import os
 import base64
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from admission import AdmissionController, Overloaded
 from barcode_image import detect_barcode
-from eligibility.ebt_eligibility import check_eligibility
+from detection_cache import DetectionCache, content_hash, perceptual_hash
+from gtin import normalize_gtin, to_off_code
+from mirrors import MirrorPool
+from providers import fdc_payload, off_payload, payload_revision, resolve, uncategorized
+from eligibility.ebt_eligibility import check_eligibility, get_policy, rule_stats
 
+# Routes declare their return type, so FastAPI serializes them straight to JSON
+# bytes through Pydantic instead of the stdlib encoder
 app = FastAPI(title="Barcode Detection API", version="1.0.0")
+logger = logging.getLogger(__name__)
 
 # Add CORS middleware to allow frontend connections
 app.add_middleware(
@@ -21,21 +37,284 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress responses for clients that send Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=500)
+
+# Eligibility responses only change with the product revision or the policy
+# version, so CDNs and the app may reuse them and revalidate with If-None-Match.
+ELIGIBILITY_MAX_AGE = int(os.environ.get("ELIGIBILITY_MAX_AGE") or 3600)
+ELIGIBILITY_CACHE_CONTROL = f"public, max-age={ELIGIBILITY_MAX_AGE}, stale-while-revalidate={ELIGIBILITY_MAX_AGE}"
+
+# Barcode detection is orders of magnitude more CPU than the lookup routes, so it
+# runs on its own bounded pool and sheds load with 503 once the queue is full.
+DETECT_CONCURRENCY = int(os.environ.get("DETECT_CONCURRENCY") or os.cpu_count() or 1)
+DETECT_QUEUE_SIZE = int(os.environ.get("DETECT_QUEUE_SIZE") or 4 * DETECT_CONCURRENCY)
+detection_gate = AdmissionController("detection", DETECT_CONCURRENCY, DETECT_QUEUE_SIZE)
+
+# Retries and burst-mode clients resend the same frame; identical bytes are
+# answered from this cache without queueing. DETECT_CACHE_PHASH=1 also matches
+# near-identical frames by perceptual hash.
+detection_cache = DetectionCache(
+    max_entries=int(os.environ.get("DETECT_CACHE_SIZE") or 512),
+    perceptual=os.environ.get("DETECT_CACHE_PHASH", "0") == "1",
+    max_distance=int(os.environ.get("DETECT_CACHE_PHASH_DISTANCE") or 6),
+)
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, please retry shortly"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+# OpenFoodFacts mirrors. Override with OFF_BASE_URLS (comma-separated),
+# e.g. to point at the local stand-in from loadtest/fake_off.py.
+OFF_BASE_URLS = [
+    u.strip().rstrip("/")
+    for u in (os.environ.get("OFF_BASE_URLS") or "https://world.openfoodfacts.org,https://us.openfoodfacts.org").split(",")
+    if u.strip()
+]
+OFF_TIMEOUT = float(os.environ.get("OFF_TIMEOUT") or 5)
+
+# Tried healthiest-first; a failing mirror is skipped for a cooldown instead of
+# costing every request a full timeout.
+off_mirrors = MirrorPool(
+    OFF_BASE_URLS,
+    timeout=OFF_TIMEOUT,
+    cooldown=float(os.environ.get("OFF_MIRROR_COOLDOWN") or 15),
+)
+
+# USDA FoodData Central, queried alongside OFF when FDC_API_KEY is set. Many US
+# store-brand items are only there.
+FDC_API_KEY = os.environ.get("FDC_API_KEY") or None
+FDC_BASE_URL = (os.environ.get("FDC_BASE_URL") or "https://api.nal.usda.gov/fdc/v1").rstrip("/")
+
+# Overall time budget for resolving a product across providers
+PROVIDER_DEADLINE = float(os.environ.get("PROVIDER_DEADLINE") or 6)
+
+# Provider responses keyed by (provider, canonical GTIN-14), so UPC-A / EAN-13 /
+# GTIN-14 spellings of the same product share one entry. Filled from worker
+# threads, including lookups that finish after their request's deadline.
+PRODUCT_CACHE_SIZE = 4096
+PRODUCT_CACHE_TTL = 15 * 60  # seconds
+_product_cache = OrderedDict()
+_product_cache_lock = threading.Lock()
+
+def _product_cache_get(key):
+    with _product_cache_lock:
+        entry = _product_cache.get(key)
+        if entry is None:
+            return None
+        stored_at, data = entry
+        if time.monotonic() - stored_at > PRODUCT_CACHE_TTL:
+            del _product_cache[key]
+            return None
+        _product_cache.move_to_end(key)
+        return data
+
+def _product_cache_put(key, data):
+    with _product_cache_lock:
+        _product_cache[key] = (time.monotonic(), data)
+        _product_cache.move_to_end(key)
+        while len(_product_cache) > PRODUCT_CACHE_SIZE:
+            _product_cache.popitem(last=False)
+
+def fetch_off_product(off_code):
+    """
+    Fetch a product from OpenFoodFacts, trying mirrors in off_mirrors health order.
+
+    Returns:
+        tuple: (data, last_error) where data is the OFF JSON (status 1 or 0) or None
+    """
+    data = None
+    last_error = None
+    for base in off_mirrors.ordered():
+        url = f"{base}/api/v0/product/{off_code}.json"
+        started = time.monotonic()
+        try:
+            resp = requests.get(url, timeout=OFF_TIMEOUT)
+            # OFF reports unknown barcodes with status 0, on a 200 or (v2) a 404
+            if resp.status_code in (200, 404):
+                try:
+                    d = resp.json()
+                except ValueError:
+                    d = None
+                if d and d.get("status") in (0, 1):
+                    data = d
+            if data is not None:
+                # An explicit "not found" is a healthy answer too
+                off_mirrors.record_success(base, time.monotonic() - started)
+                break
+            if resp.status_code == 200:
+                last_error = f"Unexpected response from {url}"
+            else:
+                last_error = f"HTTP {resp.status_code} from {url}"
+        except Exception as e:
+            # Clients only see the exception type; the details stay in the server log
+            logger.warning("OpenFoodFacts lookup failed at %s: %s", base, e)
+            last_error = f"{type(e).__name__} from {base}"
+        off_mirrors.record_failure(base, time.monotonic() - started)
+    return data, last_error
+
+def fetch_fdc_product(gtin):
+    """
+    Search FoodData Central branded foods for a GTIN-14.
+
+    The search is full-text, so only a food whose gtinUpc normalizes to the same
+    GTIN counts as a match.
+
+    Returns:
+        tuple: (data, last_error) where data is {"status": 1, "food": ...} or
+        {"status": 0}, as with fetch_off_product, or None on failure
+    """
+    # FDC stores US items as 12-digit UPC-A
+    query = gtin[2:] if gtin.startswith("00") else to_off_code(gtin)
+    try:
+        resp = requests.get(
+            f"{FDC_BASE_URL}/foods/search",
+            params={"query": query, "dataType": "Branded", "pageSize": 5},
+            # In a header, so the key never appears in a URL that ends up in an error message
+            headers={"X-Api-Key": FDC_API_KEY},
+            timeout=PROVIDER_DEADLINE,
+        )
+        if resp.status_code != 200:
+            return None, f"HTTP {resp.status_code} from FoodData Central"
+        foods = resp.json().get("foods") or []
+    except Exception as e:
+        logger.warning("FoodData Central lookup failed: %s", e)
+        return None, type(e).__name__
+    for food in foods:
+        if normalize_gtin(str(food.get("gtinUpc") or "")) == gtin:
+            return {"status": 1, "food": food}, None
+    return {"status": 0}, None
+
+def _fetch_and_cache(key, fetch, code):
+    data, last_error = fetch(code)
+    if data is not None:
+        _product_cache_put(key, data)
+    return data, last_error
+
+async def lookup_provider(provider, gtin):
+    """
+    Look a GTIN up with one provider, via the product cache.
+
+    Returns:
+        tuple: (payload, error) for providers.resolve(); payload is None if not found
+    """
+    off_code = to_off_code(gtin)
+    key = (provider, gtin)
+    data = _product_cache_get(key)
+    last_error = None
+    if data is None:
+        # Blocking HTTP; keep it off the event loop
+        fetch, code = (fetch_off_product, off_code) if provider == "off" else (fetch_fdc_product, gtin)
+        data, last_error = await run_in_threadpool(_fetch_and_cache, key, fetch, code)
+    if data is None:
+        return None, last_error or "unknown error"
+    if data.get("status") != 1:
+        return None, None
+    if provider == "off":
+        return off_payload(data.get("product", {}), off_code), None
+    return fdc_payload(data["food"], off_code), None
+
+PROVIDER_NAMES = {"off": "OpenFoodFacts", "fdc": "FoodData Central"}
+
+async def resolve_product(gtin):
+    """Query OFF, and FDC if configured, concurrently under PROVIDER_DEADLINE."""
+    lookups = {"off": lookup_provider("off", gtin)}
+    if FDC_API_KEY:
+        lookups["fdc"] = lookup_provider("fdc", gtin)
+    return await resolve(lookups, PROVIDER_DEADLINE)
+
 @app.get("/")
-async def root():
+async def root() -> dict:
     return {"message": "Barcode Detection API is running"}
 
 @app.get("/health")
-async def health_check():
+async def health_check() -> dict:
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics() -> dict:
+    """Detection work-queue and result-cache stats, plus eligibility rule counters (when tracing)."""
+    return {
+        "detection": detection_gate.stats(),
+        "detection_cache": detection_cache.stats(),
+        "eligibility_rules": rule_stats(),
+        "off_mirrors": off_mirrors.stats(),
+    }
+
 @app.get("/favicon.ico")
 async def favicon():
     """Return a simple favicon to prevent 404 errors"""
     return Response(content="", media_type="image/x-icon")
 
+def _detect_image_bytes(contents):
+    """
+    Decode image bytes and run barcode detection. Blocking; runs on the detection pool.
+
+    Returns:
+        dict with success, barcode_text, gtin, plus corners and annotated_image when available
+    """
+    # Convert bytes to PIL Image
+    pil_image = Image.open(io.BytesIO(contents))
+    
+    # Convert PIL Image to OpenCV format (BGR)
+    opencv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+    
+    # Detect barcode (without showing result)
+    result = detect_barcode(opencv_image, show_result=False)
+    
+    response_data = {
+        "success": result["success"],
+        "barcode_text": result["barcode_text"],
+        "gtin": result["gtin"],
+    }
+    
+    # Add corners if barcode was found
+    if result["success"] and result["corners"] is not None:
+        response_data["corners"] = result["corners"].tolist()
+    
+    # Add annotated image as base64 if available
+    if result["image_with_annotations"] is not None:
+        # Convert annotated image to base64
+        _, buffer = cv2.imencode('.jpg', result["image_with_annotations"])
+        img_base64 = base64.b64encode(buffer).decode('utf-8')
+        response_data["annotated_image"] = img_base64
+    
+    return response_data
+
+def _detect_and_cache(contents, digest):
+    """Perceptual-cache lookup, then full detection on a miss. Blocking; runs on the detection pool."""
+    phash = None
+    if detection_cache.perceptual:
+        phash = perceptual_hash(Image.open(io.BytesIO(contents)))
+        cached = detection_cache.get_similar(phash)
+        if cached is not None:
+            detection_cache.record("perceptual_hit")
+            detection_cache.put(digest, cached, phash)
+            return cached
+    detection_cache.record("miss")
+    result = _detect_image_bytes(contents)
+    detection_cache.put(digest, result, phash)
+    return result
+
+async def detect_cached(contents):
+    """
+    Return a cached detection result for these bytes, or queue a detection.
+    Both detection endpoints share entries: the result doesn't depend on which one asked.
+    """
+    digest = await run_in_threadpool(content_hash, contents)
+    cached = detection_cache.get(digest)
+    if cached is not None:
+        detection_cache.record("hit")
+        return cached
+    async with detection_gate.slot():
+        return await detection_gate.run(_detect_and_cache, contents, digest)
+
 @app.post("/detect-barcode")
-async def detect_barcode_endpoint(file: UploadFile = File(...)):
+async def detect_barcode_endpoint(file: UploadFile = File(...)) -> dict:
     """
     Upload an image and detect barcodes in it.
     
@@ -47,44 +326,30 @@ async def detect_barcode_endpoint(file: UploadFile = File(...)):
         if not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="File must be an image")
         
-        # Read and process the uploaded image
         contents = await file.read()
-        
-        # Convert bytes to PIL Image
-        pil_image = Image.open(io.BytesIO(contents))
-        
-        # Convert PIL Image to OpenCV format (BGR)
-        opencv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-        
-        # Detect barcode (without showing result)
-        result = detect_barcode(opencv_image, show_result=False)
+        result = await detect_cached(contents)
         
         # Prepare response
         response_data = {
             "success": result["success"],
             "barcode_text": result["barcode_text"],
+            "gtin": result["gtin"],
             "filename": file.filename,
             "file_size": len(contents)
         }
+        for key in ("corners", "annotated_image"):
+            if key in result:
+                response_data[key] = result[key]
         
-        # Add corners if barcode was found
-        if result["success"] and result["corners"] is not None:
-            response_data["corners"] = result["corners"].tolist()
-        
-        # Add annotated image as base64 if available
-        if result["image_with_annotations"] is not None:
-            # Convert annotated image to base64
-            _, buffer = cv2.imencode('.jpg', result["image_with_annotations"])
-            img_base64 = base64.b64encode(buffer).decode('utf-8')
-            response_data["annotated_image"] = img_base64
-        
-        return JSONResponse(content=response_data)
+        return response_data
         
+    except (HTTPException, Overloaded):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
 @app.post("/detect-barcode-base64")
-async def detect_barcode_base64(data: dict):
+async def detect_barcode_base64(data: dict) -> dict:
     """
     Detect barcodes from a base64 encoded image.
     
@@ -99,107 +364,97 @@ async def detect_barcode_base64(data: dict):
         
         # Decode base64 image
         image_data = base64.b64decode(data["image"])
+        result = await detect_cached(image_data)
+        # This endpoint never returned the annotated image
+        response_data = {k: v for k, v in result.items() if k != "annotated_image"}
         
-        # Convert to PIL Image
-        pil_image = Image.open(io.BytesIO(image_data))
-        
-        # Convert to OpenCV format
-        opencv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-        
-        # Detect barcode
-        result = detect_barcode(opencv_image, show_result=False)
-        
-        # Prepare response
-        response_data = {
-            "success": result["success"],
-            "barcode_text": result["barcode_text"]
-        }
-        
-        if result["success"] and result["corners"] is not None:
-            response_data["corners"] = result["corners"].tolist()
-        
-        return JSONResponse(content=response_data)
+        return response_data
         
+    except (HTTPException, Overloaded):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
 
+def eligibility_etag(gtin, payload, policy_version):
+    """
+    Weak ETag for an eligibility response, derived from the product revision at
+    each source and the policy version. Returns None if a source gives no
+    revision to key on.
+    """
+    revision = payload_revision(payload)
+    if revision is None:
+        return None
+    digest = hashlib.sha1(f"{gtin}:{revision}:{policy_version}".encode()).hexdigest()[:20]
+    # Weak, since gzip may change the bytes on the wire
+    return f'W/"{digest}"'
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against an ETag."""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in if_none_match.split(","))
+
 @app.get("/eligibility/{barcode}")
-async def eligibility_lookup(barcode: str):
+async def eligibility_lookup(barcode: str, request: Request, response: Response, trace: bool = False) -> dict:
     """
-    Lookup product by barcode via OpenFoodFacts and return Idaho SNAP eligibility.
+    Lookup product by barcode via OpenFoodFacts (and FoodData Central, if configured)
+    and return Idaho SNAP eligibility.
+
+    Responses carry an ETag and Cache-Control; a matching If-None-Match gets 304.
+    With ?trace=true the response includes the rule trace and is not cacheable.
     """
     try:
-        # Try primary OFF endpoint, then fallback to US mirror
-        urls = [
-            f"https://world.openfoodfacts.org/api/v0/product/{barcode}.json",
-            f"https://us.openfoodfacts.org/api/v0/product/{barcode}.json",
-        ]
-
-        data = None
-        last_error = None
-        for url in urls:
-            try:
-                resp = requests.get(url, timeout=5)
-                if resp.status_code == 200:
-                    d = resp.json()
-                    if d and d.get("status") == 1:
-                        data = d
-                        break
-                    elif d and d.get("status") == 0:
-                        # Explicit not found
-                        data = d
-                        break
-                else:
-                    last_error = f"HTTP {resp.status_code} from {url}"
-            except Exception as e:
-                last_error = str(e)
-
-        if data is None:
-            raise HTTPException(status_code=502, detail=f"OpenFoodFacts unreachable: {last_error or 'unknown error'}")
-        if data.get("status") != 1:
-            raise HTTPException(status_code=404, detail="Product not found")
-
-        p = data.get("product", {})
-
-        categories = p.get("categories_tags") or []
-        ingredients_text = (
-            p.get("ingredients_text_en")
-            or p.get("ingredients_text")
-            or ""
-        )
-        nutriments = p.get("nutriments") or {}
-        sugar_val = (
-            nutriments.get("sugars")
-            or nutriments.get("sugars_100g")
-            or nutriments.get("sugars_serving")
-        )
+        # Validate and canonicalize before touching the network
+        gtin = normalize_gtin(barcode)
+        if gtin is None:
+            raise HTTPException(status_code=400, detail="Invalid barcode: expected a GTIN-8/12/13/14 with a valid check digit")
 
-        product_payload = {
-            "name": p.get("product_name") or "Unknown Product",
-            "categories": categories,
-            "ingredients": ingredients_text,
-            "nutrients": {"total_sugars_g": sugar_val},
-            "barcode": str(barcode),
-        }
+        resolution = await resolve_product(gtin)
+        product_payload = resolution["payload"]
+        if product_payload is None:
+            if "not_found" in resolution["providers"].values():
+                raise HTTPException(status_code=404, detail="Product not found")
+            failures = "; ".join(
+                f"{PROVIDER_NAMES[name]}: {resolution['errors'].get(name) or f'no answer within {PROVIDER_DEADLINE:g}s'}"
+                for name in resolution["providers"]
+            )
+            raise HTTPException(status_code=502, detail=f"Product data unavailable: {failures}")
 
-        result = check_eligibility(product_payload)
+        # Revalidation needs only the product revision, not a fresh evaluation
+        etag = eligibility_etag(gtin, product_payload, get_policy()["version"])
+        cache_headers = {"Cache-Control": ELIGIBILITY_CACHE_CONTROL}
+        if etag:
+            cache_headers["ETag"] = etag
+        # A provider that errored or missed the deadline may know more next time,
+        # so a possibly degraded answer must not be cached downstream
+        degraded = any(status in ("pending", "error") for status in resolution["providers"].values())
+        if trace or degraded:
+            cache_headers = {"Cache-Control": "no-store"}
+        elif etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=cache_headers)
 
-        image_url = (
-            p.get("image_front_url")
-            or p.get("image_url")
-            or p.get("selected_images", {}).get("front", {}).get("display", {}).get("en")
-        )
+        product_payload["name"] = product_payload["name"] or "Unknown Product"
+        result = check_eligibility(product_payload, trace=trace)
+        if result["eligible"] and uncategorized(product_payload):
+            result.update(
+                eligible=None,
+                reason="FoodData Central has no category for this product; eligibility cannot be determined.",
+                user_tips=["Check the label: candy, soda, and sweetened beverages are not eligible."],
+            )
 
-        response = {
+        response.headers.update(cache_headers)
+        return {
             "name": product_payload["name"],
             "barcode": product_payload["barcode"],
-            "image": image_url,
+            "gtin": gtin,
+            "image": product_payload["image"],
             **result,
         }
 
-        return JSONResponse(content=response)
-
     except HTTPException:
         raise
     except Exception as e:
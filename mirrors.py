@@ -0,0 +1,141 @@
+import threading
+import time
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class MirrorPool:
+    """
+    Health-aware ordering of equivalent upstream mirrors.
+
+    Tracks an EWMA of latency and error rate per mirror and orders mirrors by
+    expected cost (latency plus error rate times the request timeout). A circuit
+    breaker opens after `failure_threshold` consecutive failures, or when the
+    error EWMA passes `error_threshold`. The mirror is then skipped for a cooldown
+    that doubles on each failed probe, up to `max_cooldown`. After the cooldown
+    it is half-open: one request probes it, and success closes the breaker.
+
+    Usage:
+        for url in pool.ordered():
+            try: ...; pool.record_success(url, elapsed)
+            except ...: pool.record_failure(url, elapsed)
+    """
+
+    def __init__(self, urls, timeout=5.0, alpha=0.2, failure_threshold=3, error_threshold=0.5,
+                 min_samples=5, cooldown=15.0, max_cooldown=300.0, clock=time.monotonic):
+        self.urls = list(urls)
+        self.timeout = timeout
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.error_threshold = error_threshold
+        self.min_samples = min_samples
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._health = {
+            url: {
+                "state": CLOSED,
+                "latency": None,  # EWMA seconds
+                "error_rate": 0.0,  # EWMA of failures
+                "samples": 0,
+                "consecutive_failures": 0,
+                "cooldown": cooldown,
+                "retry_at": 0.0,
+                "probing": False,
+                "probe_started": 0.0,
+                "successes": 0,
+                "failures": 0,
+                "skipped": 0,
+            }
+            for url in self.urls
+        }
+
+    def _score(self, url) -> float:
+        h = self._health[url]
+        return (h["latency"] or 0.0) + h["error_rate"] * self.timeout
+
+    def ordered(self) -> list:
+        """
+        Mirrors to try for the next request, healthiest first. A mirror whose
+        cooldown just ended goes first as the half-open probe. If every breaker
+        is open, all mirrors are returned anyway, rather than failing without trying.
+        """
+        now = self.clock()
+        with self._lock:
+            probe, healthy = [], []
+            for url in self.urls:
+                h = self._health[url]
+                if h["state"] == CLOSED:
+                    healthy.append(url)
+                elif (h["state"] == OPEN and now >= h["retry_at"]) or (
+                    # Re-issue a probe whose outcome was never recorded
+                    h["state"] == HALF_OPEN and (not h["probing"] or now - h["probe_started"] > 2 * self.timeout)
+                ):
+                    h["state"] = HALF_OPEN
+                    h["probing"] = True
+                    h["probe_started"] = now
+                    probe.append(url)
+                else:
+                    h["skipped"] += 1
+            healthy.sort(key=self._score)
+            order = probe + healthy
+            if not order:
+                order = sorted(self.urls, key=lambda u: self._health[u]["retry_at"])
+            return order
+
+    def _observe(self, h, elapsed, failed):
+        a = self.alpha
+        h["latency"] = elapsed if h["latency"] is None else (1 - a) * h["latency"] + a * elapsed
+        h["error_rate"] = (1 - a) * h["error_rate"] + a * (1.0 if failed else 0.0)
+        h["samples"] += 1
+
+    def record_success(self, url, elapsed: float):
+        with self._lock:
+            h = self._health[url]
+            self._observe(h, elapsed, failed=False)
+            h["successes"] += 1
+            h["consecutive_failures"] = 0
+            if h["state"] != CLOSED:
+                # Probe succeeded: close, and forget the outage in the error EWMA
+                h["state"] = CLOSED
+                h["error_rate"] = 0.0
+                h["cooldown"] = self.base_cooldown
+            h["probing"] = False
+
+    def record_failure(self, url, elapsed: float):
+        with self._lock:
+            h = self._health[url]
+            # A timed-out request contributes its full elapsed time to the latency EWMA
+            self._observe(h, elapsed, failed=True)
+            h["failures"] += 1
+            h["consecutive_failures"] += 1
+            if h["state"] == HALF_OPEN:
+                h["cooldown"] = min(h["cooldown"] * 2, self.max_cooldown)
+                self._open(h)
+            elif h["state"] == CLOSED and (
+                h["consecutive_failures"] >= self.failure_threshold
+                or (h["samples"] >= self.min_samples and h["error_rate"] >= self.error_threshold)
+            ):
+                self._open(h)
+            h["probing"] = False
+
+    def _open(self, h):
+        h["state"] = OPEN
+        h["retry_at"] = self.clock() + h["cooldown"]
+
+    def stats(self) -> dict:
+        now = self.clock()
+        with self._lock:
+            return {
+                url: {
+                    "state": h["state"],
+                    "latency_ms": round(h["latency"] * 1000, 1) if h["latency"] is not None else None,
+                    "error_rate": round(h["error_rate"], 3),
+                    "successes": h["successes"],
+                    "failures": h["failures"],
+                    "skipped": h["skipped"],
+                    "retry_in_s": round(max(0.0, h["retry_at"] - now), 1) if h["state"] == OPEN else 0.0,
+                }
+                for url, h in self._health.items()
+            }
@@ -0,0 +1,218 @@
+import asyncio
+import time
+
+# Fields check_eligibility() reads; a payload with all of them needs no other provider
+DECISION_FIELDS = ("name", "categories", "ingredients", "total_sugars_g")
+
+# FoodData Central brandedFoodCategory -> OpenFoodFacts category tags the policy
+# tables match, listed with their parents as OFF does
+FDC_CATEGORY_TAGS = {
+    "Soda": ["en:beverages", "en:carbonated-drinks", "en:sodas", "en:carbonated-soft-drinks"],
+    "Energy, Protein & Muscle Recovery Drinks": ["en:beverages", "en:energy-drinks"],
+    "Sport Drinks": ["en:beverages", "en:sports-drinks"],
+    "Fruit & Vegetable Juice, Nectars & Fruit Drinks": ["en:beverages", "en:juices-and-nectars"],
+    "Iced & Bottle Tea": ["en:beverages", "en:tea-based-beverages", "en:iced-teas"],
+    "Water": ["en:beverages", "en:waters"],
+    "Milk": ["en:dairies", "en:milks"],
+    "Candy": ["en:snacks", "en:sweet-snacks", "en:confectioneries", "en:candies"],
+    "Chocolate": ["en:snacks", "en:sweet-snacks", "en:cocoa-and-its-products", "en:chocolates"],
+    "Breads & Buns": ["en:cereals-and-potatoes", "en:breads"],
+    "Cereal": ["en:breakfasts", "en:breakfast-cereals"],
+    "Cheese": ["en:dairies", "en:cheeses"],
+    "Yogurt": ["en:dairies", "en:fermented-foods", "en:yogurts"],
+    "Vitamin/Mineral Supplements": ["en:dietary-supplements"],
+}
+
+# Lookups still running after resolve() returns; they finish in the background
+_background = set()
+
+
+def off_payload(product: dict, barcode: str) -> dict:
+    """Map an OpenFoodFacts product to check_eligibility() input."""
+    nutriments = product.get("nutriments") or {}
+    return {
+        "name": product.get("product_name") or "",
+        "categories": product.get("categories_tags") or [],
+        "ingredients": product.get("ingredients_text_en") or product.get("ingredients_text") or "",
+        "nutrients": {
+            "total_sugars_g": (
+                nutriments.get("sugars")
+                or nutriments.get("sugars_100g")
+                or nutriments.get("sugars_serving")
+            ),
+        },
+        "barcode": barcode,
+        "image": (
+            product.get("image_front_url")
+            or product.get("image_url")
+            or product.get("selected_images", {}).get("front", {}).get("display", {}).get("en")
+        ),
+        "source": "off",
+        "source_meta": {
+            "provider": "off",
+            "rev": product.get("rev") or product.get("last_modified_t"),
+        },
+    }
+
+
+def fdc_payload(food: dict, barcode: str) -> dict:
+    """Map a FoodData Central branded food (search result) to check_eligibility() input."""
+    sugars = None
+    for n in food.get("foodNutrients") or []:
+        # 269: "Sugars, total including NLEA", grams per 100 g for branded foods
+        if str(n.get("nutrientNumber")) == "269":
+            sugars = n.get("value")
+            break
+    return {
+        "name": " ".join(s for s in (food.get("brandOwner"), food.get("description")) if s),
+        # Unmapped FDC categories are left out rather than guessed
+        "categories": list(FDC_CATEGORY_TAGS.get(food.get("brandedFoodCategory"), [])),
+        "ingredients": food.get("ingredients") or "",
+        "nutrients": {"total_sugars_g": sugars},
+        "barcode": barcode,
+        "image": None,
+        "source": "fdc",
+        "source_meta": {
+            "provider": "fdc",
+            "dataType": food.get("dataType"),
+            "brandOwner": food.get("brandOwner"),
+            "brandedFoodCategory": food.get("brandedFoodCategory"),
+            "fdcId": food.get("fdcId"),
+            "gtinUpc": food.get("gtinUpc"),
+            "publishedDate": food.get("publishedDate"),
+        },
+    }
+
+
+def merge_payloads(payloads: list) -> dict:
+    """
+    Merge provider payloads, given in priority order. The longer category list and
+    ingredient text win; name, image and each nutrient come from the first provider
+    that has them. A single payload is returned as is.
+    """
+    if len(payloads) == 1:
+        return payloads[0]
+    fields = {}
+
+    def first(field, get):
+        for p in payloads:
+            value = get(p)
+            if value:
+                fields[field] = p["source"]
+                return value
+        return None
+
+    def richest(field):
+        best = max(payloads, key=lambda p: len(p[field]))  # first wins ties
+        if best[field]:
+            fields[field] = best["source"]
+        return best[field]
+
+    nutrients = {}
+    for p in payloads:
+        for key, value in p["nutrients"].items():
+            if nutrients.get(key) is None and value is not None:
+                nutrients[key] = value
+                fields[key] = p["source"]
+            else:
+                nutrients.setdefault(key, None)
+    merged = {
+        "name": first("name", lambda p: p["name"]) or "",
+        "categories": richest("categories"),
+        "ingredients": richest("ingredients"),
+        "nutrients": nutrients,
+        "barcode": payloads[0]["barcode"],
+        "image": first("image", lambda p: p.get("image")),
+    }
+    source = "+".join(p["source"] for p in payloads)
+    merged["source"] = source
+    merged["source_meta"] = {
+        "provider": source,
+        "fields": fields,
+        "sources": {p["source"]: p["source_meta"] for p in payloads},
+    }
+    return merged
+
+
+def has_enough_data(payload: dict) -> bool:
+    """True when every field the rules read is present, so waiting on other providers can't help."""
+    return all(
+        payload["nutrients"].get(f) is not None if f == "total_sugars_g" else payload[f]
+        for f in DECISION_FIELDS
+    )
+
+
+def uncategorized(payload: dict) -> bool:
+    """
+    True for an FDC-only payload whose category didn't map to policy tags: without
+    categories the rules can't tell soda or candy from staples, so "eligible" can't be trusted.
+    """
+    return payload["source"] == "fdc" and not payload["categories"]
+
+
+def payload_revision(payload: dict):
+    """Revision string covering every source of a payload, or None if one has no revision."""
+    meta = payload["source_meta"]
+    parts = []
+    for name, m in (meta.get("sources") or {meta["provider"]: meta}).items():
+        if name == "off":
+            rev = m.get("rev")
+        else:
+            rev = m.get("fdcId") and f"{m['fdcId']}@{m.get('publishedDate')}"
+        if not rev:
+            return None
+        parts.append(f"{name}:{rev}")
+    return ",".join(parts)
+
+
+async def resolve(lookups: dict, deadline: float) -> dict:
+    """
+    Run provider lookups concurrently and merge what they find.
+
+    `lookups` maps provider name to an awaitable returning (payload, error), in
+    priority order: payload None with no error means "not found". Returns as soon
+    as the merged payload has enough data, every provider has answered, or
+    `deadline` seconds have passed. Lookups still running are left to finish in
+    the background.
+
+    Returns:
+        dict: payload (merged, or None), status per provider ("found",
+        "not_found", "error" or "pending"), and errors per provider.
+    """
+    started = time.monotonic()
+    tasks = {asyncio.ensure_future(aw): name for name, aw in lookups.items()}
+    status = dict.fromkeys(lookups, "pending")
+    found, errors = {}, {}
+    pending = set(tasks)
+    merged = None
+    while pending:
+        remaining = deadline - (time.monotonic() - started)
+        if remaining <= 0:
+            break
+        done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            name = tasks[task]
+            try:
+                payload, error = task.result()
+            except Exception as e:
+                payload, error = None, str(e)
+            if payload is not None:
+                status[name], found[name] = "found", payload
+            elif error:
+                status[name], errors[name] = "error", error
+            else:
+                status[name] = "not_found"
+        if found:
+            merged = merge_payloads([found[n] for n in lookups if n in found])
+            if has_enough_data(merged):
+                break
+    for task in pending:
+        _background.add(task)
+        task.add_done_callback(_finish_background)
+    return {"payload": merged, "providers": status, "errors": errors}
+
+
+def _finish_background(task):
+    _background.discard(task)
+    if not task.cancelled():
+        task.exception()  # retrieve it so asyncio doesn't log it as unhandled
@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+from admission import AdmissionController, Overloaded
+
+
+async def _burst(gate, n, seconds):
+    async def job():
+        try:
+            async with gate.slot():
+                await gate.run(time.sleep, seconds)
+            return "ok"
+        except Overloaded as e:
+            return e.retry_after
+
+    return await asyncio.gather(*[job() for _ in range(n)])
+
+
+def test_sheds_beyond_queue():
+    gate = AdmissionController("test", max_concurrency=2, max_queue=3)
+    results = asyncio.run(_burst(gate, 8, 0.05))
+    assert results.count("ok") == 5
+    assert all(r >= 1 for r in results if r != "ok")
+    stats = gate.stats()
+    assert stats["rejected"] == 3
+    assert stats["completed"] == 5
+    assert stats["queue_depth"] == 0 and stats["in_flight"] == 0
+    assert stats["wait_ms"]["max"] > 0
+
+
+def test_event_loop_stays_free():
+    gate = AdmissionController("test", max_concurrency=1, max_queue=1)
+
+    async def main():
+        done = {}
+        started = time.monotonic()
+
+        async def job():
+            async with gate.slot():
+                await gate.run(time.sleep, 0.2)
+            done["job"] = time.monotonic() - started
+
+        async def cheap_route():
+            # Scheduled while detection runs; must not wait for it
+            await asyncio.sleep(0.01)
+            done["cheap"] = time.monotonic() - started
+
+        await asyncio.gather(job(), cheap_route())
+        return done
+
+    done = asyncio.run(main())
+    assert done["job"] >= 0.2
+    assert done["cheap"] < done["job"] - 0.1
@@ -0,0 +1,43 @@
+import io
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from detection_cache import DetectionCache, content_hash, perceptual_hash
+
+
+def _frame():
+    img = Image.new("L", (320, 240), 255)
+    for x in range(40, 280, 12):
+        img.paste(0, (x, 60, x + 5, 180))
+    return img
+
+
+def _recompressed(img, quality=30):
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=quality)
+    return Image.open(io.BytesIO(buf.getvalue()))
+
+
+def test_exact_hit_and_eviction():
+    cache = DetectionCache(max_entries=2)
+    for i in range(3):
+        cache.put(content_hash(bytes([i])), {"success": True, "barcode_text": str(i)})
+    assert cache.get(content_hash(bytes([0]))) is None
+    assert cache.get(content_hash(bytes([2])))["barcode_text"] == "2"
+    cache.record("miss")
+    cache.record("hit")
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["evictions"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_perceptual_near_duplicate():
+    cache = DetectionCache(perceptual=True, max_distance=6)
+    cache.put("a", {"success": True, "barcode_text": "0025000040801"}, phash=perceptual_hash(_frame()))
+    assert cache.get_similar(perceptual_hash(_recompressed(_frame())))["barcode_text"] == "0025000040801"
+    assert cache.get_similar(perceptual_hash(Image.new("L", (320, 240), 128))) is None
+    # Lookups alone don't move the counters; the caller records the outcome
+    stats = cache.stats()
+    assert stats["hits"] == stats["perceptual_hits"] == stats["misses"] == 0
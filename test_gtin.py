@@ -0,0 +1,41 @@
+import pytest
+from gtin import normalize_gtin, is_valid_gtin, to_off_code, expand_upce
+
+
+def test_upc_ean_and_gtin14_share_canonical_form():
+    assert normalize_gtin("025000040801") == "00025000040801"
+    assert normalize_gtin("0025000040801") == "00025000040801"
+    assert normalize_gtin("00025000040801") == "00025000040801"
+
+
+def test_bad_check_digit_rejected():
+    assert normalize_gtin("025000040802") is None
+    assert not is_valid_gtin("5449000131806")
+
+
+@pytest.mark.parametrize("code", ["", "abc", "12345", "123456789012345", None])
+def test_malformed_codes_rejected(code):
+    assert normalize_gtin(code) is None
+
+
+def test_separators_are_ignored():
+    assert normalize_gtin("0 25000 04080 1") == "00025000040801"
+
+
+def test_off_code():
+    assert to_off_code(normalize_gtin("025000040801")) == "0025000040801"
+    assert to_off_code(normalize_gtin("5449000131805")) == "5449000131805"
+    assert to_off_code(normalize_gtin("96385074")) == "96385074"
+
+
+def test_upce_expansion():
+    assert expand_upce("01234565") == "012345000065"
+    assert normalize_gtin("01234565", upce=True) == "00012345000065"
+
+
+def test_upce_fallback_when_ean8_check_fails():
+    # Coca-Cola can: not a valid EAN-8, but valid UPC-E
+    assert normalize_gtin("04963406") == "00049000006346"
+    assert normalize_gtin("04963406", upce=False) is None
+    # Valid EAN-8 codes are still read as EAN-8
+    assert normalize_gtin("96385074") == "00000096385074"
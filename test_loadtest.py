@@ -0,0 +1,47 @@
+import asyncio
+import json
+
+from loadtest.fake_off import FakeOFF
+from loadtest.httpio import Connection
+from loadtest.run_load import Workload, run_load, summarize
+
+
+async def _with_fake(fake, fn):
+    server = await fake.start(port=0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        return await fn(f"http://127.0.0.1:{port}")
+
+
+def test_fake_off_shapes():
+    fake = FakeOFF(latency_ms=0, not_found_rate=1.0)
+
+    async def fetch(base):
+        conn = Connection(base)
+        try:
+            return [
+                await conn.request("GET", "/api/v0/product/0025000040801.json"),
+                await conn.request("GET", "/api/v0/product/0000000000017.json"),
+                await conn.request("GET", "/api/v2/product/0000000000017"),
+            ]
+        finally:
+            await conn.close()
+
+    found, v0_missing, v2_missing = asyncio.run(_with_fake(fake, fetch))
+    assert found[0] == 200 and json.loads(found[2])["status"] == 1
+    assert v0_missing[0] == 200 and json.loads(v0_missing[2])["status"] == 0
+    assert v2_missing[0] == 404
+
+
+def test_load_report_against_fake():
+    fake = FakeOFF(latency_ms=1)
+    workload = Workload({"health": 1}, images=[], seed=3)
+
+    async def load(base):
+        # The fake does not serve /health, so every request is a 404
+        return await run_load(base, workload, concurrency=4, duration=5, max_requests=40)
+
+    samples, elapsed = asyncio.run(_with_fake(fake, load))
+    report = summarize(samples, elapsed)
+    assert report["all"]["requests"] == 40
+    assert set(report["all"]["statuses"]) == {"404"}
@@ -0,0 +1,112 @@
+import pytest
+import requests
+from fastapi.testclient import TestClient
+
+import main
+from providers import off_payload
+
+OFF_PRODUCT = {
+    "product_name": "Whole Wheat Bread",
+    "categories_tags": ["en:breads"],
+    "ingredients_text": "whole wheat flour, yeast, water, salt",
+    "nutriments": {"sugars": 3},
+    "rev": 7,
+}
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    seen = []
+
+    async def resolve_product(gtin):
+        seen.append(gtin)
+        return {"payload": off_payload(OFF_PRODUCT, gtin), "providers": {"off": "found"}, "errors": {}}
+
+    monkeypatch.setattr(main, "resolve_product", resolve_product)
+    return seen
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def test_upce_barcode_resolves_to_upca_gtin(client, lookups):
+    resp = client.get("/eligibility/04963406")
+    assert resp.status_code == 200
+    assert resp.json()["gtin"] == "00049000006346"
+    assert lookups == ["00049000006346"]
+
+
+@pytest.mark.parametrize("header, expected", [
+    ('W/"abc"', True),
+    ('"abc"', True),
+    ('"xyz", W/"abc"', True),
+    ("*", True),
+    ('"xyz"', False),
+    ("", False),
+    (None, False),
+])
+def test_etag_matches(header, expected):
+    assert main.etag_matches(header, 'W/"abc"') is expected
+
+
+def test_cache_headers(client, lookups):
+    resp = client.get("/eligibility/025000040801")
+    assert resp.status_code == 200
+    assert resp.headers["cache-control"] == main.ELIGIBILITY_CACHE_CONTROL
+    assert resp.headers["etag"].startswith('W/"')
+    # Every spelling of the barcode shares one ETag
+    assert client.get("/eligibility/0025000040801").headers["etag"] == resp.headers["etag"]
+
+
+def test_if_none_match_returns_304_without_evaluating(client, lookups, monkeypatch):
+    etag = client.get("/eligibility/025000040801").headers["etag"]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("evaluated on revalidation")
+
+    monkeypatch.setattr(main, "check_eligibility", fail)
+    resp = client.get("/eligibility/025000040801", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.content == b""
+    assert resp.headers["etag"] == etag
+
+
+def test_trace_is_not_cacheable(client, lookups):
+    etag = client.get("/eligibility/025000040801").headers["etag"]
+    resp = client.get("/eligibility/025000040801?trace=true", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["cache-control"] == "no-store"
+    assert "etag" not in resp.headers
+    assert "trace" in resp.json()
+
+
+def test_provider_errors_do_not_leak_api_key(client, monkeypatch):
+    calls = []
+
+    def unreachable(url, params=None, headers=None, timeout=None):
+        calls.append((url, params, headers))
+        raise requests.ConnectionError(f"Max retries exceeded with url: {url}?{params}")
+
+    monkeypatch.setattr(main, "FDC_API_KEY", "SECRETKEY123")
+    monkeypatch.setattr(main.requests, "get", unreachable)
+    resp = client.get("/eligibility/0000000000017")
+    assert resp.status_code == 502
+    assert "SECRETKEY123" not in resp.text
+    assert "ConnectionError" in resp.json()["detail"]
+    fdc = [c for c in calls if "/foods/search" in c[0]]
+    assert fdc and fdc[0][2] == {"X-Api-Key": "SECRETKEY123"}
+    assert "SECRETKEY123" not in str(fdc[0][1])
+
+
+def test_degraded_answer_is_not_cacheable(client, monkeypatch):
+    async def resolve_product(gtin):
+        payload = off_payload(OFF_PRODUCT, gtin)
+        return {"payload": payload, "providers": {"off": "found", "fdc": "pending"}, "errors": {}}
+
+    monkeypatch.setattr(main, "resolve_product", resolve_product)
+    resp = client.get("/eligibility/025000040801")
+    assert resp.status_code == 200
+    assert resp.headers["cache-control"] == "no-store"
+    assert "etag" not in resp.headers
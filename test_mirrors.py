@@ -0,0 +1,84 @@
+from mirrors import CLOSED, HALF_OPEN, OPEN, MirrorPool
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _pool(**kwargs):
+    clock = FakeClock()
+    return MirrorPool(["a", "b", "c"], timeout=5.0, cooldown=10.0, clock=clock, **kwargs), clock
+
+
+def test_orders_by_latency_and_errors():
+    pool, _ = _pool()
+    assert pool.ordered() == ["a", "b", "c"]
+    pool.record_success("a", 0.9)
+    pool.record_success("b", 0.1)
+    pool.record_success("c", 0.3)
+    assert pool.ordered() == ["b", "c", "a"]
+    # One error costs b a share of the timeout, pushing it to the back
+    pool.record_failure("b", 0.1)
+    assert pool.ordered() == ["c", "a", "b"]
+
+
+def test_breaker_opens_and_probes_after_cooldown():
+    pool, clock = _pool()
+    for _ in range(3):
+        pool.record_failure("a", 5.0)
+    assert pool.stats()["a"]["state"] == OPEN
+    assert "a" not in pool.ordered()
+
+    clock.now = 10.0
+    assert pool.ordered()[0] == "a"  # the half-open probe goes first
+    assert pool.stats()["a"]["state"] == HALF_OPEN
+    assert "a" not in pool.ordered()  # only one probe at a time
+
+    # Failed probe: reopen with a doubled cooldown
+    pool.record_failure("a", 5.0)
+    assert pool.stats()["a"]["state"] == OPEN
+    clock.now = 29.0
+    assert "a" not in pool.ordered()
+    clock.now = 30.0
+    assert pool.ordered()[0] == "a"
+
+    pool.record_success("a", 0.2)
+    stats = pool.stats()["a"]
+    assert stats["state"] == CLOSED
+    assert stats["error_rate"] == 0.0
+
+
+def test_unrecorded_probe_is_reissued():
+    pool, clock = _pool(failure_threshold=1)
+    pool.record_failure("a", 1.0)
+    clock.now = 10.0
+    assert pool.ordered()[0] == "a"
+    clock.now = 15.0
+    assert "a" not in pool.ordered()
+    clock.now = 20.5
+    assert pool.ordered()[0] == "a"
+
+
+def test_error_rate_opens_breaker_without_consecutive_failures():
+    pool, _ = _pool(min_samples=4, error_threshold=0.5)
+    # Two of every three requests fail; never three in a row
+    for outcome in "ffsff":
+        if outcome == "f":
+            pool.record_failure("a", 0.1)
+        else:
+            pool.record_success("a", 0.1)
+    assert pool.stats()["a"]["state"] == OPEN
+
+
+def test_all_open_still_returns_every_mirror():
+    pool, clock = _pool(failure_threshold=1)
+    pool.record_failure("b", 1.0)
+    clock.now = 1.0
+    pool.record_failure("a", 1.0)
+    pool.record_failure("c", 1.0)
+    assert pool.ordered() == ["b", "a", "c"]  # soonest retry first
+    assert pool.stats()["a"]["retry_in_s"] == 10.0
@@ -0,0 +1,94 @@
+import asyncio
+
+from eligibility.ebt_eligibility import check_eligibility
+from providers import (
+    fdc_payload, has_enough_data, merge_payloads, off_payload, payload_revision, resolve, uncategorized,
+)
+
+OFF_PRODUCT = {
+    "product_name": "Cola",
+    "categories_tags": ["en:beverages", "en:sodas"],
+    "ingredients_text": "",
+    "nutriments": {},
+    "rev": 7,
+}
+FDC_FOOD = {
+    "description": "COLA",
+    "brandOwner": "Store Brand",
+    "brandedFoodCategory": "Soda",
+    "ingredients": "CARBONATED WATER, HIGH FRUCTOSE CORN SYRUP, CARAMEL COLOR",
+    "foodNutrients": [{"nutrientNumber": "269", "value": 10.6}],
+    "dataType": "Branded",
+    "fdcId": 123,
+    "gtinUpc": "012345678905",
+    "publishedDate": "2024-01-01",
+}
+
+
+def test_merge_prefers_richer_fields():
+    off = off_payload(OFF_PRODUCT, "0012345678905")
+    fdc = fdc_payload(FDC_FOOD, "0012345678905")
+    assert not has_enough_data(off)
+
+    merged = merge_payloads([off, fdc])
+    assert merged["name"] == "Cola"
+    assert merged["categories"] == fdc["categories"]
+    assert merged["ingredients"].startswith("CARBONATED WATER")
+    assert merged["nutrients"]["total_sugars_g"] == 10.6
+    assert merged["source"] == "off+fdc"
+    assert merged["source_meta"]["fields"] == {
+        "name": "off", "categories": "fdc", "ingredients": "fdc", "total_sugars_g": "fdc"}
+    assert has_enough_data(merged)
+    assert payload_revision(merged) == "off:7,fdc:123@2024-01-01"
+
+
+def test_fdc_only_soda_is_not_eligible():
+    fdc = fdc_payload(FDC_FOOD, "0012345678905")
+    assert "en:carbonated-soft-drinks" in fdc["categories"]
+    assert not uncategorized(fdc)
+    assert check_eligibility(fdc, "ID")["eligible"] is False
+
+    unmapped = fdc_payload(dict(FDC_FOOD, brandedFoodCategory="Specialty Formula Supplements"), "0012345678905")
+    assert unmapped["categories"] == []
+    assert uncategorized(unmapped)
+    assert not uncategorized(merge_payloads([off_payload(OFF_PRODUCT, "0012345678905"), unmapped]))
+
+
+def _lookup(result, delay):
+    async def run():
+        await asyncio.sleep(delay)
+        return result
+    return run()
+
+
+def test_resolve_returns_early_when_confident():
+    complete = off_payload(dict(OFF_PRODUCT, ingredients_text="water", nutriments={"sugars": 1}), "0012345678905")
+
+    async def go():
+        resolution = await resolve({"off": _lookup((complete, None), 0), "fdc": _lookup((None, None), 5)}, 2.0)
+        await asyncio.sleep(0)
+        return resolution
+
+    resolution = asyncio.run(asyncio.wait_for(go(), 1.0))
+    assert resolution["payload"] is complete
+    assert resolution["providers"] == {"off": "found", "fdc": "pending"}
+
+
+def test_resolve_fills_gaps_and_respects_deadline():
+    off = off_payload(OFF_PRODUCT, "0012345678905")
+    fdc = fdc_payload(FDC_FOOD, "0012345678905")
+
+    resolution = asyncio.run(resolve({"off": _lookup((off, None), 0.01), "fdc": _lookup((fdc, None), 0.02)}, 1.0))
+    assert resolution["payload"]["source"] == "off+fdc"
+
+    # Partial data from OFF is still returned when FDC misses the deadline
+    resolution = asyncio.run(resolve({"off": _lookup((off, None), 0), "fdc": _lookup((fdc, None), 5)}, 0.05))
+    assert resolution["payload"] is off
+    assert resolution["providers"]["fdc"] == "pending"
+
+
+def test_resolve_reports_not_found_and_errors():
+    resolution = asyncio.run(resolve({"off": _lookup((None, None), 0), "fdc": _lookup((None, "HTTP 500"), 0)}, 1.0))
+    assert resolution["payload"] is None
+    assert resolution["providers"] == {"off": "not_found", "fdc": "error"}
+    assert resolution["errors"] == {"fdc": "HTTP 500"}